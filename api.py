@@ -0,0 +1,98 @@
+"""Point d'entrée HTTP et ligne de commande des agrégats, sans l'interface Streamlit.
+
+    python api.py serve --port 8502
+        GET /activity.csv?zone=ZC&start_date=2024-01-01
+        GET /month.json   GET /sex.parquet   GET /zone.json
+    python api.py export activity --format parquet --zone ZC -o activites_zc.parquet
+"""
+import argparse
+import hashlib
+import logging
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from query import AGGREGATES, CONTENT_TYPES, FilterError, render
+
+logger = logging.getLogger(__name__)
+
+FILTERS = ['zone', 'sexe', 'age_group', 'activity_type', 'start_date', 'end_date']
+
+
+class AggregateHandler(BaseHTTPRequestHandler):
+    """GET /<agrégat>.<format>?<filtres> ; paramètres inconnus et valeurs de filtre invalides sont refusés (400)."""
+
+    def _send(self, status, body, content_type='text/plain; charset=utf-8', etag=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'max-age=60')
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        name, _, fmt = url.path.strip('/').partition('.')
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        unknown = set(params) - set(FILTERS)
+        if unknown:
+            return self._send(400, f"Paramètres inconnus : {', '.join(sorted(unknown))}".encode('utf-8'))
+        try:
+            body = render(name, fmt or 'json', **params)
+        except FilterError as e:
+            return self._send(400, str(e).encode('utf-8'))
+        except (KeyError, ValueError) as e:
+            return self._send(404, str(e).encode('utf-8'))
+        except Exception:
+            logger.exception("Erreur lors du calcul de %s", self.path)
+            return self._send(500, "Erreur interne".encode('utf-8'))
+
+        etag = '"%s"' % hashlib.sha256(body).hexdigest()[:16]
+        if self.headers.get('If-None-Match') == etag:
+            return self._send(304, b'', etag=etag)
+        self._send(200, body, CONTENT_TYPES[fmt or 'json'], etag)
+
+    do_HEAD = do_GET
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve = commands.add_parser('serve', help='serveur HTTP local')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8502)
+    export = commands.add_parser('export', help='écrit un agrégat dans un fichier ou sur la sortie standard')
+    export.add_argument('aggregate', choices=AGGREGATES)
+    export.add_argument('--format', choices=list(CONTENT_TYPES), default='csv')
+    export.add_argument('-o', '--output', help='fichier de sortie (sortie standard par défaut)')
+    for name in FILTERS:
+        export.add_argument(f"--{name.replace('_', '-')}", dest=name)
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        logging.basicConfig(level=logging.INFO)
+        server = ThreadingHTTPServer((args.host, args.port), AggregateHandler)
+        logger.info("Agrégats servis sur http://%s:%s/", args.host, args.port)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
+        return 0
+
+    try:
+        body = render(args.aggregate, args.format, **{name: getattr(args, name) for name in FILTERS})
+    except FilterError as e:
+        parser.error(str(e))
+    if args.output:
+        with open(args.output, 'wb') as f:
+            f.write(body)
+    else:
+        sys.stdout.buffer.write(body)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,16 +1,15 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import altair as alt
-import folium
-from folium.plugins import MarkerCluster
-from streamlit_folium import st_folium
-import geopandas as gpd
-import plotly.express as px
-import plotly.graph_objs as go
-from data_loader import load_data  # Assurez-vous que ce module est correct
-from utils import merge_data, filter_data  # Assurez-vous que ce module est correct
-from datetime import datetime
+from store import current_dataset
+from cube import totals_by, monthly_totals, sex_totals
+from map_layer import cached_map
+from figure_cache import figure_cache
+from filter_index import filter_key
+from chart_data import top_n
+from kpi import format_count
+# Les bibliothèques de visualisation et de géométrie (plotly, folium, shapely) sont importées
+# à la demande via lazy_import, seulement quand la section qui les utilise s'affiche
+from tracing import finish_trace, lazy_import, render_debug_panel, stage, start_trace
 
 #######################
 # Page configuration
@@ -21,7 +20,7 @@ st.set_page_config(
     initial_sidebar_state='expanded'
 )
 
-# alt.themes.enable("dark")
+# lazy_import('altair').themes.enable("dark")
 
 # #######################
 # # CSS styling
@@ -43,24 +42,23 @@ st.set_page_config(
 # </style>
 # """, unsafe_allow_html=True)
 
+# Trace des durées par étape pour cette exécution du script
+start_trace()
+
 #######################
 # Load data
-villages, activities = load_data()
-if villages is None or activities is None:
-    st.error("Impossible de charger les données.")
-    st.stop()
-
-# Fusion des données
-
-data = merge_data(villages, activities)
-if data is None:
-    st.error("La fusion des données a échoué.")
+# Jeu de données partagé (lecture seule) par toutes les sessions : index des filtres et cube inclus.
+# Rechargé en arrière-plan quand data/ change, l'ancienne version reste servie jusqu'à l'échange
+try:
+    with stage('dataset'):
+        dataset = current_dataset()
+except Exception as e:
+    st.error(f"Impossible de charger les données : {e}")
     st.stop()
 
-# Vérification et ajout des colonnes latitude et longitude si elles n'existent pas
-if 'latitude' not in data.columns or 'longitude' not in data.columns:
-    data['latitude'] = 15.0 + (data.index % 10) * 0.1
-    data['longitude'] = -15.0 - (data.index % 10) * 0.1
+data = dataset.data
+cube = dataset.cube
+kpis = dataset.kpis
 
 #######################
 # Sidebar
@@ -91,8 +89,18 @@ with st.sidebar:
                                             value=(min_date.to_pydatetime(), max_date.to_pydatetime()),
                                             format="MMM YYYY")
 
-# Filtrer les données
-filtered_data = filter_data(data, zone, None, sexe, age_group, activity_type, start_date, end_date)
+    debug_mode = st.checkbox('Mode debug (durées par étape)', key='debug_mode')
+    debug_panel = st.container()
+
+# Les graphiques et indicateurs sont servis par le cube et la table des KPI, sans filtrer les lignes
+with stage('cube_slice') as info:
+    cube_cells = cube.slice(zone, sexe, age_group, activity_type, start_date, end_date)
+    info['rows'] = len(cube_cells)
+with stage('kpis'):
+    summary = kpis.summary(zone, sexe, age_group, activity_type, start_date, end_date)
+
+# Clé de cache des figures : état normalisé des filtres et version des données
+filter_state = filter_key(zone, sexe, age_group, activity_type, start_date, end_date)
 
 #######################
 # Dashboard Main Panel
@@ -103,29 +111,34 @@ st.markdown("# CorpsAfrica/Sénégal : Dashboard Novembre à Avril")
 col1, col2, col3, col4 = st.columns(4)
 # Row 3: Activity and Beneficiaries
 col1, col2 = st.columns([1, 1])
+# Sections et bénéficiaires indirects n'ont pas de colonne source : valeurs du rapport d'activité
 col1.metric("Sections d'Activités", 15)
-col1.metric("Activités", 604)
-col2.metric("Bénéficiaires Directs", "38K")
+col1.metric("Activités", summary["Nbre d'activité"])
+col1.metric("Types d'activité", summary['Activité'])
+col2.metric("Bénéficiaires Directs", format_count(summary['Total Beneficiaire']))
 col2.metric("Bénéficiaires Indirects", "75K")
+col2.metric("Volontaires", summary['Volontaire'])
 
 # Row 2: Maps and Charts
-# col1, col2 = st.columns([2, 1])
-
-# with col1:
-#     st.markdown("### Répartition des Volontaires au Sénégal")
-#     m = folium.Map(location=[14.4974, -14.4524], zoom_start=6)
-#     marker_cluster = MarkerCluster().add_to(m)
-
-#     for _, row in filtered_data.iterrows():
-#         folium.Marker(
-#             location=[row['latitude'], row['longitude']],
-#              popup=f"Village: {row['Régions']}<br>Activité: {row['Activité']}<br>Total Bénéficiaires: {row['Total Beneficiaire']}",
-#             icon=folium.Icon(color='blue', icon='info-sign')
-#         ).add_to(marker_cluster)
-
-#     st_folium(m, width=700, height=500)
-
-# with col2:
+col1, col2 = st.columns([2, 1])
+zone_totals = totals_by(cube_cells, 'ZONE')
+
+with col1:
+    st.markdown("### Répartition des Volontaires au Sénégal")
+    # Couche unique de marqueurs agrégés par village, mise en cache par état des filtres
+    with stage('map:build'):
+        m = cached_map(dataset.version, filter_state, zone_totals, dataset.villages)
+    with stage('map:render'):
+        map_state = lazy_import('streamlit_folium').st_folium(m, width=700, height=500)
+    drawing = (map_state or {}).get('last_active_drawing')
+    if drawing:
+        # Requête spatiale sur l'index STRtree des villages, sans parcourir les activités
+        area = lazy_import('shapely.geometry').shape(drawing['geometry'])
+        area_villages = dataset.geo_index.in_area(area)
+        st.caption(f"{len(area_villages)} village(s) dans la zone dessinée : "
+                   f"{', '.join(dataset.geo_index.zones_in(area)) or 'aucune zone'}")
+
+with col2:
 #     st.markdown("### Répartition des Bénéficiaires par Sexe")
 #     pie_data = filtered_data[['M', 'F']].sum().reset_index()
 #     pie_data.columns = ['Sexe', 'Total Beneficiaire']
@@ -134,10 +147,13 @@ col2.metric("Bénéficiaires Indirects", "75K")
 #     fig_pie = px.pie(pie_data, values='Total Beneficiaire', names='Sexe', title='Répartition du total des bénéficiaires par sexe')
 #     st.plotly_chart(fig_pie)
 
-#     st.markdown("### Répartition des Bénéficiaires par Région")
-#     region_data = filtered_data.groupby('ZONE')['Total Beneficiaire'].sum().reset_index()
-#     fig_region = px.bar(region_data, x='ZONE', y='Total Beneficiaire', title='Répartition par Zone')
-#     st.plotly_chart(fig_region, use_container_width=True)
+    st.markdown("### Répartition des Bénéficiaires par Région")
+    with stage('region:figure', len(zone_totals)):
+        fig_region = figure_cache.figure(
+            ('region', dataset.version, filter_state),
+            lambda: lazy_import('plotly.express').bar(zone_totals, x='ZONE', y='Total Beneficiaire', title='Répartition par Zone'))
+    with stage('region:render'):
+        st.plotly_chart(fig_region, use_container_width=True)
 
 # # Row 3: Activity and Beneficiaries
 # col1, col2 = st.columns([1, 1])
@@ -148,24 +164,32 @@ col2.metric("Bénéficiaires Indirects", "75K")
 
 # Row 4: Detailed Charts
 st.markdown("### Total Bénéficiaires par Secteur d'Activité")
-activity_sector = filtered_data.groupby('Activité')['Total Beneficiaire'].sum().reset_index()
-fig_activity = px.bar(activity_sector, x='Activité', y='Total Beneficiaire', title='Total Bénéficiaires par Activité')
-st.plotly_chart(fig_activity, use_container_width=True)
+with stage('activity:figure'):
+    # Agrégation et construction de la figure seulement en cas d'absence du cache ;
+    # les activités au-delà des principales sont regroupées dans « Autres »
+    fig_activity = figure_cache.figure(
+        ('activity', dataset.version, filter_state),
+        lambda: lazy_import('plotly.express').bar(top_n(totals_by(cube_cells, 'Activité'), 'Activité', 'Total Beneficiaire'),
+                       x='Activité', y='Total Beneficiaire', title='Total Bénéficiaires par Activité'))
+with stage('activity:render'):
+    st.plotly_chart(fig_activity, use_container_width=True)
 
 st.markdown("### Total Bénéficiaires par Mois")
-filtered_data['month'] = filtered_data['Date'].dt.to_period('M')
-aggregated_monthly_data = filtered_data.groupby('month')['Total Beneficiaire'].sum().reset_index()
-aggregated_monthly_data['month'] = aggregated_monthly_data['month'].astype(str)
-fig_monthly = px.line(aggregated_monthly_data, x='month', y='Total Beneficiaire', title='Total Bénéficiaires par Mois')
-st.plotly_chart(fig_monthly, use_container_width=True)
+with stage('monthly:figure'):
+    fig_monthly = figure_cache.figure(
+        ('monthly', dataset.version, filter_state),
+        lambda: lazy_import('plotly.express').line(monthly_totals(cube_cells), x='month', y='Total Beneficiaire', title='Total Bénéficiaires par Mois'))
+with stage('monthly:render'):
+    st.plotly_chart(fig_monthly, use_container_width=True)
 
 # Diagramme circulaire du total de bénéficiaires par sexe
-pie_data = filtered_data[['M', 'F']].sum().reset_index()
-pie_data.columns = ['Sexe', 'Total Beneficiaire']
-pie_data['Sexe'] = pie_data['Sexe'].apply(lambda x: 'Masculin' if x == 'M' else 'Féminin')
-
-fig_pie = px.pie(pie_data, values='Total Beneficiaire', names='Sexe', title='Répartition du total des bénéficiaires par sexe')
-st.plotly_chart(fig_pie)
+with stage('pie:figure'):
+    fig_pie = figure_cache.figure(
+        ('pie', dataset.version, filter_state),
+        lambda: lazy_import('plotly.express').pie(sex_totals(cube_cells), values='Total Beneficiaire', names='Sexe',
+                       title='Répartition du total des bénéficiaires par sexe'))
+with stage('pie:render'):
+    st.plotly_chart(fig_pie)
 
 #######################
 # Footer
@@ -182,3 +206,8 @@ hide_default_format = """
        </style>
        """
 st.markdown(hide_default_format, unsafe_allow_html=True)
+
+# Fin de la trace : journal structuré et panneau de debug optionnel
+trace = finish_trace()
+if debug_mode:
+    render_debug_panel(debug_panel, trace)
@@ -0,0 +1,142 @@
+"""Artefacts précalculés d'une version des données, partagés en lecture seule par tous les processus.
+
+Un répertoire par version (data/.cache/build/v<format>-<version>/) contient la table fusionnée,
+les villages et régions résolus, les cellules du cube et des indicateurs en Arrow IPC, ainsi que
+les bitmaps de l'index des filtres et les esquisses HyperLogLog creuses en .npy. Tout est projeté en mémoire
+(mmap) : les pages sont partagées entre processus par le cache du système. Le fichier CURRENT désigne
+la version publiée, la même pour tous les processus.
+"""
+import json
+import os
+import shutil
+
+import numpy as np
+import pyarrow as pa
+
+from data_loader import CACHE_DIR, read_arrow, write_arrow
+
+BUILD_DIR = os.path.join(CACHE_DIR, 'build')
+CURRENT_PATH = os.path.join(BUILD_DIR, 'CURRENT')
+# À incrémenter quand le contenu ou la disposition des artefacts change
+ARTIFACTS_FORMAT = 2
+# Versions conservées : la version publiée et la précédente, encore projetée par les processus en cours d'échange
+KEEP_VERSIONS = 2
+
+
+def artifact_dir(version):
+    return os.path.join(BUILD_DIR, f'v{ARTIFACTS_FORMAT}-{version}')
+
+
+def published_version():
+    """Version publiée par la dernière construction, ou None si aucune construction n'existe."""
+    try:
+        with open(CURRENT_PATH, encoding='utf-8') as f:
+            version = f.read().strip()
+    except OSError:
+        return None
+    if not os.path.exists(os.path.join(artifact_dir(version), 'manifest.json')):
+        return None
+    return version
+
+
+def _json_key(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _write_frame(df, path):
+    write_arrow(pa.Table.from_pandas(df, preserve_index=False), path)
+
+
+def _write_bitmaps(directory, group, bitmaps, size):
+    keys = list(bitmaps)
+    stacked = np.stack([bitmaps[key] for key in keys]) if keys else np.zeros((0, (size + 7) // 8), dtype=np.uint8)
+    np.save(os.path.join(directory, f'index-{group}.npy'), stacked)
+    return [_json_key(key) for key in keys]
+
+
+def write_artifacts(dataset):
+    """Écrit les artefacts d'un jeu de données (store.Dataset) puis publie sa version."""
+    directory = artifact_dir(dataset.version)
+    tmp_directory = f'{directory}.tmp'
+    shutil.rmtree(tmp_directory, ignore_errors=True)
+    os.makedirs(tmp_directory)
+
+    _write_frame(dataset.data, os.path.join(tmp_directory, 'dataset.arrow'))
+    _write_frame(dataset.villages, os.path.join(tmp_directory, 'villages.arrow'))
+    if dataset.geo_index.regions is not None:
+        _write_frame(dataset.geo_index.regions, os.path.join(tmp_directory, 'regions.arrow'))
+    _write_frame(dataset.cube.cells, os.path.join(tmp_directory, 'cube.arrow'))
+    _write_frame(dataset.kpis.cells, os.path.join(tmp_directory, 'kpi-cells.arrow'))
+    sketches = {}
+    for i, (column, sketch) in enumerate(dataset.kpis.sketches.items()):
+        # Esquisse creuse : (offsets, buckets, ranks), un fichier par tableau
+        sketches[column] = [f'kpi-{i}-{part}.npy' for part in ('offsets', 'buckets', 'ranks')]
+        for name, values in zip(sketches[column], sketch):
+            np.save(os.path.join(tmp_directory, name), values)
+
+    index = dataset.filter_index
+    np.save(os.path.join(tmp_directory, 'index-row_months.npy'), index.row_months)
+    manifest = {
+        'format': ARTIFACTS_FORMAT,
+        'version': dataset.version,
+        'rows': len(dataset.data),
+        'index': {
+            'size': index.size,
+            'keys': {group: _write_bitmaps(tmp_directory, group, getattr(index, group), index.size)
+                     for group in index.BITMAP_GROUPS},
+        },
+        'sketches': sketches,
+    }
+    # Le manifeste est écrit en dernier : sa présence signale des artefacts complets
+    with open(os.path.join(tmp_directory, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp_directory, directory)
+    _publish(dataset.version)
+    return directory
+
+
+def _publish(version):
+    tmp_path = f'{CURRENT_PATH}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(tmp_path, CURRENT_PATH)
+    builds = sorted((os.path.join(BUILD_DIR, name) for name in os.listdir(BUILD_DIR)
+                     if name.startswith('v') and not name.endswith('.tmp')), key=os.path.getmtime, reverse=True)
+    for stale in builds[KEEP_VERSIONS:]:
+        shutil.rmtree(stale, ignore_errors=True)
+
+
+def read_artifacts(version):
+    """Parties d'un jeu de données projetées en mémoire, ou None si la version n'a pas été construite."""
+    directory = artifact_dir(version)
+    try:
+        with open(os.path.join(directory, 'manifest.json'), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except OSError:
+        return None
+
+    def frame(name):
+        path = os.path.join(directory, name)
+        return read_arrow(path).to_pandas(split_blocks=True) if os.path.exists(path) else None
+
+    def array(name):
+        return np.load(os.path.join(directory, name), mmap_mode='r')
+
+    index = manifest['index']
+    bitmaps = {}
+    for group, keys in index['keys'].items():
+        stacked = array(f'index-{group}.npy')
+        bitmaps[group] = {key: stacked[i] for i, key in enumerate(keys)}
+    return {
+        'data': frame('dataset.arrow'),
+        'villages': frame('villages.arrow'),
+        'regions': frame('regions.arrow'),
+        'cube_cells': frame('cube.arrow'),
+        'kpi_cells': frame('kpi-cells.arrow'),
+        'sketches': {column: tuple(array(name) for name in names) for column, names in manifest['sketches'].items()},
+        'index_size': index['size'],
+        'row_months': array('index-row_months.npy'),
+        'bitmaps': bitmaps,
+    }
@@ -0,0 +1,322 @@
+"""Moteurs de requête interchangeables pour le filtrage et les agrégations.
+
+Tous exposent la même interface que `utils.filter_data` (mêmes filtres) :
+`filter(**filtres)`, `aggregate(by, measure, **filtres)` et `totals(columns, **filtres)`.
+Avec SQLite (bibliothèque standard) ou DuckDB (optionnel), filtre et agrégation sont compilés
+en une seule requête exécutée dans le moteur ; seul le résultat agrégé remonte en pandas.
+Les moteurs Arrow (pyarrow) et Polars (optionnel) exécutent un plan paresseux sur un fichier
+Arrow projeté en mémoire : seules les colonnes utiles sont lues et la conversion en pandas
+n'a lieu qu'à la fin, sur le résultat agrégé.
+"""
+import contextlib
+import glob
+import os
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+
+from data_loader import CACHE_DIR, write_arrow
+from dates import month_bound
+from filter_index import AGE_GROUP_COLUMNS, SEX_COLUMNS, FilterIndex, SelectionCache
+from utils import filter_data
+
+# Moteur par défaut, choisi par variable d'environnement : pandas, sqlite, duckdb, arrow ou polars
+QUERY_BACKEND = os.environ.get('QUERY_BACKEND', 'pandas')
+INDEXED_COLUMNS = ['ZONE', 'Activité', 'month_key']
+
+
+class PandasBackend:
+    """Exécution en mémoire : bitmaps de FilterIndex (sélections en cache) puis groupby pandas."""
+
+    def __init__(self, data):
+        self.data = data
+        self.index = SelectionCache(FilterIndex(data))
+
+    def filter(self, zone=None, sexe=None, age_group=None, activity_type=None, start_date=None, end_date=None):
+        return filter_data(self.data, zone, None, sexe, age_group, activity_type, start_date, end_date, index=self.index)
+
+    def aggregate(self, by, measure='Total Beneficiaire', **filters):
+        rows = self.filter(**filters)
+        return rows.groupby(by, observed=True)[measure].sum().sort_index().reset_index()
+
+    def totals(self, columns, **filters):
+        return self.filter(**filters)[columns].sum()
+
+
+def _quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+
+def _present(columns):
+    # Même règle que filter_data : la somme des colonnes (NULL compté comme 0) est positive
+    return '(' + ' + '.join(f'COALESCE({_quote(column)}, 0)' for column in columns) + ') > 0'
+
+
+def compile_filters(zone=None, sexe=None, age_group=None, activity_type=None, start_date=None, end_date=None):
+    """Clause WHERE paramétrée (avec des ?) équivalente aux filtres de la barre latérale."""
+    clauses, params = [], []
+    if zone:
+        clauses.append('"ZONE" = ?')
+        params.append(str(zone))
+    if sexe in SEX_COLUMNS:
+        clauses.append(_present(SEX_COLUMNS[sexe]))
+    if age_group in AGE_GROUP_COLUMNS:
+        clauses.append(_present(AGE_GROUP_COLUMNS[age_group]))
+    if activity_type:
+        clauses.append('"Activité" = ?')
+        params.append(str(activity_type))
+    if start_date:
+        clauses.append('"month_key" >= ?')
+        params.append(month_bound(start_date, ceil=True))
+    if end_date:
+        clauses.append('"month_key" <= ?')
+        params.append(month_bound(end_date))
+    return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+
+def _plain_frame(data):
+    # Les catégories sont stockées comme texte ; les effectifs compacts (uint8...) sont élargis
+    # pour que les sommes du moteur ne débordent pas
+    frame = data.copy()
+    for column in frame.columns:
+        if isinstance(frame[column].dtype, pd.CategoricalDtype):
+            frame[column] = frame[column].astype(object).where(frame[column].notna(), None)
+        elif pd.api.types.is_integer_dtype(frame[column]):
+            frame[column] = frame[column].astype('int64')
+    return frame
+
+
+class FileBackend:
+    """Base des moteurs sur fichier : la table fusionnée est écrite une fois par version des données.
+
+    `load()` renvoie la table fusionnée ; elle n'est appelée que si le fichier de la version n'existe pas,
+    les autres processus interrogent directement le fichier sans charger la table en mémoire.
+    """
+
+    extension = None
+
+    def __init__(self, load, version):
+        self.path = os.path.join(CACHE_DIR, f'query-{version}.{self.extension}')
+        if not os.path.exists(self.path):
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            # Fichier temporaire propre au processus : plusieurs processus peuvent construire la même version
+            tmp_path = f'{self.path}.{uuid.uuid4().hex[:12]}.tmp'
+            try:
+                self._build(_plain_frame(load()), tmp_path)
+                os.replace(tmp_path, self.path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            # Un autre processus construisant la même version peut avoir déjà supprimé le fichier
+            for stale_path in glob.glob(os.path.join(CACHE_DIR, f'query-*.{self.extension}')):
+                if stale_path != self.path:
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(stale_path)
+
+    def _build(self, frame, path):
+        raise NotImplementedError
+
+
+class SqlBackend(FileBackend):
+    """Base des moteurs SQL embarqués, interrogeant la table `activities`."""
+
+    table = 'activities'
+
+    def _connect(self):
+        raise NotImplementedError
+
+    def _query(self, sql, params):
+        connection = self._connect()
+        try:
+            cursor = connection.execute(sql, params)
+            names = [description[0] for description in cursor.description]
+            return pd.DataFrame(cursor.fetchall(), columns=names)
+        finally:
+            connection.close()
+
+    def filter(self, **filters):
+        where, params = compile_filters(**filters)
+        return self._query(f'SELECT * FROM {self.table}{where}', params)
+
+    def aggregate(self, by, measure='Total Beneficiaire', **filters):
+        where, params = compile_filters(**filters)
+        return self._query(
+            f'SELECT {_quote(by)}, SUM({_quote(measure)}) AS {_quote(measure)} FROM {self.table}{where} '
+            f'GROUP BY {_quote(by)} ORDER BY {_quote(by)}', params)
+
+    def totals(self, columns, **filters):
+        where, params = compile_filters(**filters)
+        sums = ', '.join(f'COALESCE(SUM({_quote(column)}), 0) AS {_quote(column)}' for column in columns)
+        return self._query(f'SELECT {sums} FROM {self.table}{where}', params).iloc[0]
+
+
+class SqliteBackend(SqlBackend):
+    """SQLite sur disque (bibliothèque standard), avec index sur les colonnes filtrées."""
+
+    extension = 'sqlite'
+
+    def _connect(self):
+        import sqlite3
+
+        # Connexion en lecture seule par requête : sûr entre les threads du serveur Streamlit
+        return sqlite3.connect(f'file:{self.path}?mode=ro', uri=True, check_same_thread=False)
+
+    def _build(self, frame, path):
+        import sqlite3
+
+        connection = sqlite3.connect(path)
+        try:
+            frame.to_sql(self.table, connection, index=False)
+            for column in INDEXED_COLUMNS:
+                connection.execute(f'CREATE INDEX {_quote("idx_" + column)} ON {self.table} ({_quote(column)})')
+            connection.commit()
+        finally:
+            connection.close()
+
+
+class DuckDbBackend(SqlBackend):
+    """DuckDB sur disque : parcours en colonnes multi-threadés, hors mémoire au-delà de la RAM."""
+
+    extension = 'duckdb'
+
+    _connection = None
+
+    def _connect(self):
+        import duckdb
+
+        # Ouvrir la base coûte des dizaines de ms : une connexion partagée, un curseur par requête
+        if self._connection is None:
+            self._connection = duckdb.connect(self.path, read_only=True)
+        return self._connection.cursor()
+
+    def _build(self, frame, path):
+        import duckdb
+
+        connection = duckdb.connect(path)
+        try:
+            connection.register('frame', frame)
+            connection.execute(f'CREATE TABLE {self.table} AS SELECT * FROM frame')
+        finally:
+            connection.close()
+
+
+class ArrowBackend(FileBackend):
+    """Plan pyarrow.dataset : filtre et projection poussés au parcours, agrégation multi-threadée en C++."""
+
+    extension = 'arrow'
+
+    def _build(self, frame, path):
+        write_arrow(pa.Table.from_pandas(frame, preserve_index=False), path)
+
+    def _expression(self, zone=None, sexe=None, age_group=None, activity_type=None, start_date=None, end_date=None):
+        import pyarrow.compute as pc
+
+        def present(columns):
+            total = pc.coalesce(pc.field(columns[0]), 0)
+            for column in columns[1:]:
+                total = pc.add(total, pc.coalesce(pc.field(column), 0))
+            return total > 0
+
+        conditions = []
+        if zone:
+            conditions.append(pc.field('ZONE') == str(zone))
+        if sexe in SEX_COLUMNS:
+            conditions.append(present(SEX_COLUMNS[sexe]))
+        if age_group in AGE_GROUP_COLUMNS:
+            conditions.append(present(AGE_GROUP_COLUMNS[age_group]))
+        if activity_type:
+            conditions.append(pc.field('Activité') == str(activity_type))
+        if start_date:
+            conditions.append(pc.field('month_key') >= month_bound(start_date, ceil=True))
+        if end_date:
+            conditions.append(pc.field('month_key') <= month_bound(end_date))
+        expression = None
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+        return expression
+
+    def _scan(self, columns, filters):
+        import pyarrow.dataset as ds
+
+        return ds.dataset(self.path, format='arrow').to_table(columns=columns, filter=self._expression(**filters))
+
+    def filter(self, **filters):
+        return self._scan(None, filters).to_pandas()
+
+    def aggregate(self, by, measure='Total Beneficiaire', **filters):
+        grouped = self._scan([by, measure], filters).group_by(by).aggregate([(measure, 'sum')])
+        result = grouped.rename_columns([measure if name == f'{measure}_sum' else name for name in grouped.column_names])
+        return result.sort_by(by).select([by, measure]).to_pandas()
+
+    def totals(self, columns, **filters):
+        import pyarrow.compute as pc
+
+        table = self._scan(columns, filters)
+        return pd.Series({column: pc.sum(table[column]).as_py() or 0 for column in columns})
+
+
+class PolarsBackend(FileBackend):
+    """Plan paresseux Polars sur le fichier Arrow (scan_ipc) : optimiseur, pushdown et exécution parallèle."""
+
+    extension = 'arrow'
+
+    _build = ArrowBackend._build
+
+    def _plan(self, zone=None, sexe=None, age_group=None, activity_type=None, start_date=None, end_date=None):
+        import polars as pl
+
+        def present(columns):
+            return pl.sum_horizontal([pl.col(column).fill_null(0) for column in columns]) > 0
+
+        plan = pl.scan_ipc(self.path)
+        if zone:
+            plan = plan.filter(pl.col('ZONE') == str(zone))
+        if sexe in SEX_COLUMNS:
+            plan = plan.filter(present(SEX_COLUMNS[sexe]))
+        if age_group in AGE_GROUP_COLUMNS:
+            plan = plan.filter(present(AGE_GROUP_COLUMNS[age_group]))
+        if activity_type:
+            plan = plan.filter(pl.col('Activité') == str(activity_type))
+        if start_date:
+            plan = plan.filter(pl.col('month_key') >= month_bound(start_date, ceil=True))
+        if end_date:
+            plan = plan.filter(pl.col('month_key') <= month_bound(end_date))
+        return plan
+
+    def filter(self, **filters):
+        return self._plan(**filters).collect().to_pandas()
+
+    def aggregate(self, by, measure='Total Beneficiaire', **filters):
+        import polars as pl
+
+        plan = self._plan(**filters).group_by(by).agg(pl.col(measure).sum()).sort(by)
+        return plan.collect().to_pandas()
+
+    def totals(self, columns, **filters):
+        import polars as pl
+
+        row = self._plan(**filters).select([pl.col(column).sum() for column in columns]).collect()
+        return pd.Series({column: row[column][0] or 0 for column in columns})
+
+
+BACKENDS = {
+    'pandas': PandasBackend,
+    'sqlite': SqliteBackend,
+    'duckdb': DuckDbBackend,
+    'arrow': ArrowBackend,
+    'polars': PolarsBackend,
+}
+
+
+def get_backend(load, version, name=None):
+    """Moteur `name` (QUERY_BACKEND par défaut) pour la table fusionnée d'une version des données.
+
+    `load()` renvoie cette table ; les moteurs sur fichier ne l'appellent que pour écrire leur fichier.
+    """
+    name = name or QUERY_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Moteur de requête inconnu : {name} (disponibles : {', '.join(BACKENDS)})")
+    if name == 'pandas':
+        return PandasBackend(load())
+    return BACKENDS[name](load, version)
@@ -6,8 +6,13 @@ import plotly.express as px
 import plotly.graph_objs as go
 import folium
 from streamlit_folium import st_folium
-from data_loader import load_data  # Assurez-vous que ce module est correct
+from data_loader import load_data, data_version  # Assurez-vous que ce module est correct
 from utils import merge_data, filter_data  # Assurez-vous que ce module est correct
+from map_layer import build_map, map_points
+from figure_cache import figure_cache
+from filter_index import filter_key
+from chart_data import aggregate, downsample, top_n
+from kpi import KpiTable
 from datetime import datetime
 
 # Configuration de la page
@@ -85,10 +90,15 @@ filtered_data = filter_data(data, zone, None, sexe, age_group, activity_type, st
  #   st.metric("Bénéficiaires directs", beneficiaries_direct)
 #with col4:
  #   st.metric("Bénéficiaires indirects", beneficiaries_indirect)
-# Calculer les totaux pour les métriques globales
-total_activities = filtered_data['Activité'].nunique()
-total_beneficiaries = filtered_data['Total Beneficiaire'].sum()
-total_sectors = filtered_data['Activité'].nunique()
+# Calculer les totaux pour les métriques globales (table d'indicateurs construite une fois par version)
+@st.cache_resource(max_entries=1)
+def load_kpis(version, _data):
+    return KpiTable(_data)
+
+summary = load_kpis(data_version(), data).summary(zone, sexe, age_group, activity_type, start_date, end_date)
+total_activities = summary['Activité']
+total_beneficiaries = summary['Total Beneficiaire']
+total_sectors = summary['Activité']
 beneficiaries_direct = total_beneficiaries  # Adapter si nécessaire
 beneficiaries_indirect = total_beneficiaries * 10  # Exemple de multiplicateur
 
@@ -104,12 +114,15 @@ with col2:
 
 # Graphiques
 if not filtered_data.empty:
-    # Total bénéficiaires par activité
-    fig_activities = px.bar(filtered_data, x='Activité', y='Total Beneficiaire', title='Total Bénéficiaires par Activité')
+    # Total bénéficiaires par activité : agrégé puis limité aux principales activités (+ « Autres »)
+    activity_totals = top_n(aggregate(filtered_data, 'Activité', 'Total Beneficiaire'), 'Activité', 'Total Beneficiaire')
+    fig_activities = px.bar(activity_totals, x='Activité', y='Total Beneficiaire', title='Total Bénéficiaires par Activité')
     st.plotly_chart(fig_activities)
     
     # Agréger les bénéficiaires par date
-    aggregated_data = filtered_data.groupby('Date')[['Total Beneficiaire', 'M', 'F']].sum().reset_index()
+    aggregated_data = aggregate(filtered_data, 'Date', ['Total Beneficiaire', 'M', 'F'])
+    # Nombre de points (et d'étiquettes) borné quelle que soit la profondeur de l'historique
+    aggregated_data = downsample(aggregated_data, 'Date', 'Total Beneficiaire')
 
     # Graphique de l'évolution des bénéficiaires par date avec étiquettes
     fig_beneficiaries = px.line(aggregated_data, x='Date', y='Total Beneficiaire', title='Évolution du nombre total de bénéficiaires par date',
@@ -131,38 +144,45 @@ if not filtered_data.empty:
     st.plotly_chart(fig_pie)
     
    
-    # Agrégation par mois
-    aggregated_monthly_data = filtered_data.groupby(filtered_data['Date'].dt.to_period('M')).sum().reset_index()
-
-    # Convertir les périodes en chaînes de caractères pour rendre les données sérialisables en JSON
-    aggregated_monthly_data['Date'] = aggregated_monthly_data['Date'].astype(str)
-
-    # Créer le graphique à barres côte à côte avec Plotly graph_objs
-    fig_comparison = go.Figure()
-
-    # Ajouter les barres pour 'M' (hommes)
-    fig_comparison.add_trace(go.Bar(
-        x=aggregated_monthly_data['Date'],
-        y=aggregated_monthly_data['M'],
-        name='Hommes',
-        marker_color='blue'
-    ))
-
-    # Ajouter les barres pour 'F' (femmes)
-    fig_comparison.add_trace(go.Bar(
-        x=aggregated_monthly_data['Date'],
-        y=aggregated_monthly_data['F'],
-        name='Femmes',
-        marker_color='pink'
-    ))
-
-    # Mise en page du titre et des étiquettes des axes
-    fig_comparison.update_layout(
-        title='Comparaison du nombre de bénéficiaires hommes et femmes par mois',
-        xaxis_title='Mois',
-        yaxis_title='Nombre de bénéficiaires',
-        barmode='group'  # Pour afficher les barres côte à côte
-    )
+    def build_comparison_figure():
+        # Agrégation par mois
+        aggregated_monthly_data = filtered_data.groupby(filtered_data['Date'].dt.to_period('M'))[['M', 'F']].sum().reset_index()
+
+        # Convertir les périodes en chaînes de caractères pour rendre les données sérialisables en JSON
+        aggregated_monthly_data['Date'] = aggregated_monthly_data['Date'].astype(str)
+
+        # Créer le graphique à barres côte à côte avec Plotly graph_objs
+        fig_comparison = go.Figure()
+
+        # Ajouter les barres pour 'M' (hommes)
+        fig_comparison.add_trace(go.Bar(
+            x=aggregated_monthly_data['Date'],
+            y=aggregated_monthly_data['M'],
+            name='Hommes',
+            marker_color='blue'
+        ))
+
+        # Ajouter les barres pour 'F' (femmes)
+        fig_comparison.add_trace(go.Bar(
+            x=aggregated_monthly_data['Date'],
+            y=aggregated_monthly_data['F'],
+            name='Femmes',
+            marker_color='pink'
+        ))
+
+        # Mise en page du titre et des étiquettes des axes
+        fig_comparison.update_layout(
+            title='Comparaison du nombre de bénéficiaires hommes et femmes par mois',
+            xaxis_title='Mois',
+            yaxis_title='Nombre de bénéficiaires',
+            barmode='group'  # Pour afficher les barres côte à côte
+        )
+        return fig_comparison
+
+    # Figure mise en cache par état des filtres et version des données
+    fig_comparison = figure_cache.figure(
+        ('comparison', data_version(), filter_key(zone, sexe, age_group, activity_type, start_date, end_date)),
+        build_comparison_figure)
 
     # Afficher le graphique dans Streamlit
     st.plotly_chart(fig_comparison)
@@ -182,18 +202,10 @@ if not filtered_data.empty:
 # # Afficher la carte dans Streamlit
 # st_folium(m, width=700, height=500) 
 
-# # Carte interactive des villages avec clustering
+# # Carte interactive des villages avec clustering (une couche agrégée par village)
 # st.markdown("### Carte Interactive des Villages")
-# m = folium.Map(location=[15.0, -15.0], zoom_start=6)  # Initialiser la carte centrée sur le Sénégal
-# marker_cluster = MarkerCluster().add_to(m)
-
-# # Ajouter des points pour chaque village
-# for _, row in filtered_data.iterrows():
-#     folium.Marker(
-#         location=[row['latitude'], row['longitude']],
-#         popup=f"Village: {row['Régions']}<br>Activité: {row['Activité']}<br>Total Bénéficiaires: {row['Total Beneficiaire']}",
-#         icon=folium.Icon(color='blue', icon='info-sign')
-#     ).add_to(marker_cluster)
+# zone_totals = filtered_data.groupby('ZONE', observed=True)['Total Beneficiaire'].sum().reset_index()
+# m = build_map(map_points(zone_totals, villages))
 
 # # Afficher la carte dans Streamlit
 # st_folium(m, width=700, height=500)
@@ -230,6 +242,7 @@ import plotly.express as px
 import plotly.graph_objs as go
 from data_loader import load_data  # Assurez-vous que ce module est correct
 from utils import merge_data, filter_data  # Assurez-vous que ce module est correct
+from map_layer import build_map, map_points
 from datetime import datetime
 
 #######################
@@ -331,16 +344,8 @@ col1, col2 = st.columns([2, 1])
 
 with col1:
     st.markdown("### Répartition des Volontaires au Sénégal")
-    m = folium.Map(location=[14.4974, -14.4524], zoom_start=6)
-    marker_cluster = MarkerCluster().add_to(m)
-
-    for _, row in filtered_data.iterrows():
-        folium.Marker(
-            location=[row['latitude'], row['longitude']],
-            popup=f"Village: {row['village']}<br>Activité: {row['activité']}<br>Total Bénéficiaires: {row['total_beneficiaires']}",
-            icon=folium.Icon(color='blue', icon='info-sign')
-        ).add_to(marker_cluster)
-
+    zone_totals = filtered_data.groupby('ZONE', observed=True)['Total Beneficiaire'].sum().reset_index()
+    m = build_map(map_points(zone_totals, villages))
     st_folium(m, width=700, height=500)
 
 with col2:
@@ -0,0 +1,231 @@
+"""Banc d'essai du pipeline chargement → fusion → filtrage → agrégation sur données synthétiques.
+
+    python benchmark.py --rows 10000 100000 1000000 --output bench.json
+    python benchmark.py --rows 100000 --compare bench.json
+    python benchmark.py --imports          # coût des imports au démarrage d'un processus
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from cube import Cube, monthly_totals, sex_totals, totals_by
+from data_loader import DATE_FORMAT, read_activities, read_arrow, write_arrow
+from filter_index import AGE_GROUP_COLUMNS, FilterIndex
+from kpi import KpiTable
+from schema import apply_schema
+from utils import filter_data, merge_data
+
+ZONES = ['ZC', 'ZN', 'ZO', 'ZS']
+REGIONS = ['Thiès', 'Kaolack', 'Kaffrine', 'Fatick', 'Louga', 'Saint-Louis', 'Kédougou', 'Ziguinchor', 'Sédhiou']
+
+# Modules importés au démarrage de app.py, puis bibliothèques chargées à la demande
+STARTUP_MODULES = ['streamlit', 'pandas', 'pyarrow', 'store', 'cube', 'kpi', 'figure_cache', 'map_layer']
+LAZY_MODULES = ['plotly.express', 'folium', 'folium.plugins', 'streamlit_folium', 'shapely.geometry', 'altair']
+
+# Combinaisons de filtres représentatives de la barre latérale
+FILTER_CASES = [
+    {},
+    {'zone': 'ZC'},
+    {'zone': 'ZN', 'sexe': 'F'},
+    {'age_group': '18-24', 'start_date': '2023-12-01', 'end_date': '2024-03-01'},
+    {'zone': 'ZS', 'sexe': 'M', 'age_group': '-18', 'activity_type': 'Activité 3'},
+]
+
+
+def generate_villages(villages_per_zone=13, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = len(ZONES) * villages_per_zone
+    return pd.DataFrame({
+        'Village': [f'Village {i}' for i in range(rows)],
+        'Régions': rng.choice(REGIONS, rows),
+        'pays': 'Sénégal',
+        'ZONE': np.repeat(ZONES, villages_per_zone),
+        'latitude': rng.uniform(12.3, 16.6, rows),
+        'longitude': rng.uniform(-17.5, -11.4, rows),
+    })
+
+
+def generate_activities(rows, n_activities=300, seed=0):
+    """Activités synthétiques au schéma de activities.xlsx (dates au format "Nov. 2023")."""
+    rng = np.random.default_rng(seed)
+    months = pd.date_range('2023-11-01', periods=6, freq='MS').strftime(DATE_FORMAT)
+    activities = pd.DataFrame({
+        'Date': rng.choice(months, rows),
+        'Volontaire': rng.integers(0, 150, rows).astype(str),
+        'ZONE': rng.choice(ZONES, rows),
+        "Nbre d'activité": 1,
+        'Activité': np.char.add('Activité ', rng.integers(0, n_activities, rows).astype(str)),
+    })
+    for columns in AGE_GROUP_COLUMNS.values():
+        for column in columns:
+            activities[column] = rng.poisson(3, rows) * (rng.random(rows) < 0.4)
+    activities['M'] = activities[[c for c in activities.columns if c.endswith('|HOMME')]].sum(axis=1)
+    activities['F'] = activities[[c for c in activities.columns if c.endswith('|FEMME')]].sum(axis=1)
+    activities['Total Beneficiaire'] = activities['M'] + activities['F']
+    return activities
+
+
+def _measure(func, *args, **kwargs):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, {'seconds': round(seconds, 6), 'peak_mb': round(peak / 2 ** 20, 3)}
+
+
+def _filter_all(data, index=None):
+    return [filter_data(data, index=index, **case) for case in FILTER_CASES]
+
+
+def _legacy_charts(frames):
+    for frame in frames:
+        frame.groupby('Activité')['Total Beneficiaire'].sum()
+        frame.groupby(frame['Date'].dt.to_period('M'))['Total Beneficiaire'].sum()
+        frame[['M', 'F']].sum()
+
+
+def _cube_charts(cube):
+    for case in FILTER_CASES:
+        cells = cube.slice(**case)
+        totals_by(cells, 'Activité')
+        monthly_totals(cells)
+        sex_totals(cells)
+
+
+def run(rows, excel_max_rows, workdir):
+    stages = {}
+    villages = generate_villages()
+    activities = generate_activities(rows)
+
+    if rows <= excel_max_rows:
+        excel_path = os.path.join(workdir, f'activities-{rows}.xlsx')
+        activities.to_excel(excel_path, index=False)
+        raw, stages['excel_read'] = _measure(read_activities, excel_path)
+    else:
+        raw, stages['date_parse'] = _measure(
+            lambda: activities.assign(Date=pd.to_datetime(activities['Date'], format=DATE_FORMAT))
+        )
+
+    arrow_path = os.path.join(workdir, f'activities-{rows}.arrow')
+    _, stages['arrow_write'] = _measure(lambda: write_arrow(pa.Table.from_pandas(raw, preserve_index=False), arrow_path))
+    raw, stages['arrow_read'] = _measure(lambda: read_arrow(arrow_path).to_pandas())
+    typed, stages['schema'] = _measure(apply_schema, raw)
+    data, stages['merge'] = _measure(merge_data, apply_schema(villages), typed)
+    _, stages['filter_masks'] = _measure(_filter_all, data)
+    index, stages['filter_index_build'] = _measure(FilterIndex, data)
+    frames, stages['filter_index'] = _measure(_filter_all, data, index)
+    _, stages['charts_groupby'] = _measure(_legacy_charts, frames)
+    cube, stages['cube_build'] = _measure(Cube, data)
+    _, stages['charts_cube'] = _measure(_cube_charts, cube)
+    kpis, stages['kpi_build'] = _measure(KpiTable, data)
+    _, stages['kpi_summary'] = _measure(lambda: [kpis.summary(**case) for case in FILTER_CASES])
+    return {'rows': rows, 'merged_rows': len(data), 'stages': stages}
+
+
+def import_costs(modules):
+    """Durée cumulée de l'import de chaque module dans un processus neuf (python -X importtime) et mémoire résidente finale."""
+    code = ''.join(f'import {module}\n' for module in modules)
+    code += 'import resource\nprint(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)\n'
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True, check=True)
+    costs = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Seuls les imports de premier niveau (non indentés) sont rapportés
+        if name.strip() in modules and not name[1:].startswith(' ') and cumulative.strip().isdigit():
+            costs[name.strip()] = round(int(cumulative) / 1000, 3)
+    # 0 : module déjà chargé par un import précédent de la liste
+    return {
+        'modules': [{'module': module, 'cumulative_ms': costs.get(module, 0.0)} for module in modules],
+        'max_rss_mb': round(int(process.stdout.split()[-1]) / 1024, 1),
+    }
+
+
+def startup_report():
+    """Coût d'un démarrage à froid de app.py, puis de chaque bibliothèque différée prise isolément."""
+    startup = import_costs(STARTUP_MODULES)
+    lazy = []
+    for module in LAZY_MODULES:
+        report = import_costs(STARTUP_MODULES + [module])
+        lazy.append({**report['modules'][-1], 'extra_rss_mb': round(report['max_rss_mb'] - startup['max_rss_mb'], 1)})
+    return {'startup': startup, 'lazy': lazy}
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline, threshold):
+    """Liste les étapes dont le temps dépasse `threshold` fois celui de la référence."""
+    previous = {run['rows']: run['stages'] for run in baseline['runs']}
+    regressions = []
+    for result in current['runs']:
+        for stage, timing in result['stages'].items():
+            before = previous.get(result['rows'], {}).get(stage)
+            if before and before['seconds'] > 0 and timing['seconds'] > threshold * before['seconds']:
+                regressions.append({
+                    'rows': result['rows'], 'stage': stage,
+                    'before': before['seconds'], 'after': timing['seconds'],
+                    'ratio': round(timing['seconds'] / before['seconds'], 2),
+                })
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--excel-max-rows', type=int, default=100_000,
+                        help="au-delà, l'étape Excel est remplacée par la seule conversion des dates")
+    parser.add_argument('--output', help='fichier JSON de résultats (sortie standard par défaut)')
+    parser.add_argument('--compare', help='résultats JSON de référence à comparer')
+    parser.add_argument('--threshold', type=float, default=1.25)
+    parser.add_argument('--imports', action='store_true', help="rapport des coûts d'import au démarrage")
+    args = parser.parse_args(argv)
+
+    if args.imports:
+        print(json.dumps(startup_report(), indent=2, ensure_ascii=False))
+        return 0
+
+    with tempfile.TemporaryDirectory() as workdir:
+        report = {
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'runs': [run(rows, args.excel_max_rows, workdir) for rows in args.rows],
+        }
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"Régression {regression['stage']} ({regression['rows']} lignes) : "
+                  f"{regression['before']}s → {regression['after']}s (x{regression['ratio']})", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
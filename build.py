@@ -0,0 +1,41 @@
+"""Construction des artefacts partagés pour un déploiement à plusieurs processus Streamlit.
+
+    python build.py            # construit et publie la version courante de data/
+    python build.py --force    # reconstruit même si la version est déjà publiée
+
+Chaque processus projette ensuite ces artefacts en mémoire au démarrage (store.build_dataset)
+et sert la version publiée ; relancer la construction après une mise à jour de data/ suffit
+pour que tous les processus basculent ensemble sur la nouvelle version.
+"""
+import argparse
+import logging
+import sys
+import time
+
+from artifacts import published_version, write_artifacts
+from data_loader import data_version
+from store import build_from_sources
+
+logger = logging.getLogger(__name__)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--force', action='store_true', help='reconstruit même si la version est déjà publiée')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    version = data_version()
+    if published_version() == version and not args.force:
+        logger.info("Version %s déjà publiée", version)
+        return 0
+    start = time.perf_counter()
+    dataset = build_from_sources(version)
+    directory = write_artifacts(dataset)
+    logger.info("Version %s publiée dans %s (%s lignes, %.1f s)", version, directory, len(dataset.data),
+                time.perf_counter() - start)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+# Bornes de taille des données envoyées au navigateur
+MAX_CATEGORIES = 25
+MAX_POINTS = 500
+OTHERS_LABEL = 'Autres'
+
+
+def aggregate(df, by, values):
+    """Somme des valeurs par catégorie, avant tout tracé (une barre par catégorie et non par ligne)."""
+    return df.groupby(by, observed=True)[values].sum().reset_index()
+
+
+def top_n(df, category, value, n=MAX_CATEGORIES, others_label=OTHERS_LABEL):
+    """Garde les `n - 1` premières catégories et regroupe le reste dans « Autres »."""
+    if len(df) <= n:
+        return df.sort_values(value, ascending=False)
+    ranked = df.sort_values(value, ascending=False)
+    head = ranked.iloc[:n - 1]
+    others = pd.DataFrame({category: [others_label], value: [ranked[value].iloc[n - 1:].sum()]})
+    return pd.concat([head.astype({category: str}), others], ignore_index=True)
+
+
+def _numeric(values):
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype('datetime64[ns]').astype('int64').astype(float)
+    return values.astype(float)
+
+
+def lttb_indices(x, y, threshold):
+    """Indices retenus par l'algorithme Largest-Triangle-Three-Buckets (x croissant)."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = _numeric(x)
+    y = _numeric(y)
+    every = (n - 2) / (threshold - 2)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        if end >= n - 1 or end >= next_end:
+            avg_x, avg_y = x[n - 1], y[n - 1]
+        else:
+            avg_x, avg_y = x[end:next_end].mean(), y[end:next_end].mean()
+        # Aire du triangle (point retenu précédent, candidat, moyenne du seau suivant), vectorisée par seau
+        areas = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+    return selected
+
+
+def downsample(df, x, y, max_points=MAX_POINTS):
+    """Série temporelle réduite à `max_points` points en conservant sa forme visuelle."""
+    df = df.sort_values(x)
+    return df.iloc[lttb_indices(df[x].to_numpy(), df[y].to_numpy(), max_points)]
@@ -0,0 +1,42 @@
+import pandas as pd
+import pytest
+
+from benchmark import generate_activities, generate_villages
+from dates import key_to_timestamp, parse_month_keys
+from filter_index import AGE_GROUP_COLUMNS, SEX_COLUMNS
+from schema import apply_schema
+from utils import merge_data
+
+# Zones des villages synthétiques, plus une zone inconnue ; bornes de dates à cheval sur les mois
+ZONES = ['ZC', 'ZN', 'ZO', 'ZS', 'ZX']
+DATES = pd.date_range('2023-10-15', '2024-05-15', freq='SMS')
+
+
+@pytest.fixture(scope='session')
+def data():
+    """Table fusionnée synthétique (5000 activités), partagée par les tests."""
+    activities = generate_activities(5_000, n_activities=20)
+    keys = parse_month_keys(activities['Date'])
+    activities['Date'] = key_to_timestamp(keys)
+    activities['month_key'] = keys
+    return merge_data(apply_schema(generate_villages()), apply_schema(activities))
+
+
+@pytest.fixture(scope='session')
+def random_filters(data):
+    """Tirage d'une combinaison de filtres : chaque filtre est posé une fois sur deux, valeurs inconnues
+    et plages vides comprises."""
+    activities = list(data['Activité'].cat.categories) + ['Activité inconnue']
+
+    def draw(rng):
+        pick = lambda values: values[rng.integers(len(values))] if rng.random() < 0.5 else None
+        return {
+            'zone': pick(ZONES),
+            'sexe': pick(list(SEX_COLUMNS)),
+            'age_group': pick(list(AGE_GROUP_COLUMNS)),
+            'activity_type': pick(activities),
+            'start_date': pick(DATES),
+            'end_date': pick(DATES),
+        }
+
+    return draw
@@ -0,0 +1,97 @@
+import pandas as pd
+
+from dates import format_months, month_bound, month_key
+from filter_index import AGE_GROUP_COLUMNS, SEX_COLUMNS
+
+MEASURES = ['Total Beneficiaire', 'M', 'F'] + [column for columns in AGE_GROUP_COLUMNS.values() for column in columns]
+
+# Les filtres Sexe et Tranche d'âge retiennent les lignes où la catégorie est présente :
+# le cube est donc indexé par des indicateurs de présence plutôt que par des modalités dépliées
+SEX_FLAGS = {sexe: f'has_{sexe}' for sexe in SEX_COLUMNS}
+AGE_FLAGS = {group: f'has_{group}' for group in AGE_GROUP_COLUMNS}
+DIMENSIONS = ['ZONE', 'Activité', 'month_key'] + list(SEX_FLAGS.values()) + list(AGE_FLAGS.values())
+# Version du format des cellules, à incrémenter quand les dimensions changent (agrégats sur disque)
+CUBE_FORMAT = 2
+
+
+def _widen(values):
+    # Les effectifs compacts (uint8/uint16) sont élargis avant sommation pour éviter tout débordement
+    if pd.api.types.is_integer_dtype(values):
+        return values.astype('int64')
+    return values.astype('float64')
+
+
+def slice_mask(cells, zone=None, sexe=None, age_group=None, activity_type=None, start_date=None, end_date=None):
+    """Masque des cellules (indexées par DIMENSIONS) correspondant à la combinaison de filtres."""
+    mask = pd.Series(True, index=cells.index)
+    if zone:
+        mask &= cells['ZONE'] == zone
+    if sexe in SEX_FLAGS:
+        mask &= cells[SEX_FLAGS[sexe]]
+    if age_group in AGE_FLAGS:
+        mask &= cells[AGE_FLAGS[age_group]]
+    if activity_type:
+        mask &= cells['Activité'] == activity_type
+    if start_date:
+        mask &= cells['month_key'] >= month_bound(start_date, ceil=True)
+    if end_date:
+        mask &= cells['month_key'] <= month_bound(end_date)
+    return mask
+
+
+def facts(df):
+    """Clés des dimensions du cube pour chaque ligne d'activité."""
+    keys = pd.concat([df[['ZONE', 'Activité']], _flags(df)], axis=1)
+    keys['month_key'] = df['month_key'] if 'month_key' in df.columns else month_key(df['Date'])
+    return keys[DIMENSIONS]
+
+
+def _flags(df):
+    flags = pd.DataFrame(index=df.index)
+    for sexe, columns in SEX_COLUMNS.items():
+        flags[SEX_FLAGS[sexe]] = df[columns].fillna(0).sum(axis=1) > 0
+    for group, columns in AGE_GROUP_COLUMNS.items():
+        flags[AGE_FLAGS[group]] = df[columns].fillna(0).sum(axis=1) > 0
+    return flags
+
+
+class Cube:
+    """Agrégat des bénéficiaires par (ZONE, Activité, mois, sexe, tranche d'âge), construit au chargement.
+
+    Les graphiques et métriques découpent ce cube au lieu de parcourir les lignes d'activités.
+    """
+
+    def __init__(self, df):
+        rows = facts(df)
+        for measure in MEASURES:
+            rows[measure] = _widen(df[measure].fillna(0))
+        self.cells = rows.groupby(DIMENSIONS, sort=True, observed=True, dropna=False)[MEASURES].sum().reset_index()
+
+    @classmethod
+    def from_cells(cls, cells):
+        """Reconstruit un cube à partir de cellules déjà agrégées (ex. agrégats mensuels concaténés)."""
+        cube = cls.__new__(cls)
+        cube.cells = cells.astype({'ZONE': 'category', 'Activité': 'category'})
+        return cube
+
+    def slice(self, zone=None, sexe=None, age_group=None, activity_type=None, start_date=None, end_date=None):
+        """Renvoie les cellules du cube correspondant à la combinaison de filtres."""
+        return self.cells[slice_mask(self.cells, zone, sexe, age_group, activity_type, start_date, end_date)]
+
+
+def totals_by(cells, dimension, measure='Total Beneficiaire'):
+    return cells.groupby(dimension, observed=True)[measure].sum().sort_index().reset_index()
+
+
+def monthly_totals(cells, measure='Total Beneficiaire'):
+    """Totaux par mois, libellés en français (ex. « nov. 2023 ») via la table des mois."""
+    monthly = totals_by(cells, 'month_key', measure)
+    monthly.insert(0, 'month', format_months(monthly['month_key'], 'label_fr').astype(str))
+    return monthly.drop(columns='month_key')
+
+
+def sex_totals(cells):
+    pie_data = cells[['M', 'F']].sum().reset_index()
+    pie_data.columns = ['Sexe', 'Total Beneficiaire']
+    pie_data['Sexe'] = pie_data['Sexe'].map({'M': 'Masculin', 'F': 'Féminin'})
+    return pie_data
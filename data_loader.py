@@ -1,21 +1,325 @@
+import glob
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+
+import openpyxl
 import pandas as pd
-import streamlit as st
+import pyarrow as pa
 
-@st.cache_data
-def load_data():
+from dates import DATE_FORMAT, format_months, key_to_timestamp, parse_month_keys
+from fileio import atomic_write
+from quality import RULES_VERSION, quarantine
+from schema import COUNT_COLUMNS, NON_NUMERIC_COLUMN, apply_schema, memory_report, validate_activities
+from tracing import stage
+
+logger = logging.getLogger(__name__)
+DATA_DIR = 'data'
+CACHE_DIR = os.path.join(DATA_DIR, '.cache')
+VILLAGES_PATH = os.path.join(DATA_DIR, 'map.xlsx')
+ACTIVITIES_PATH = os.path.join(DATA_DIR, 'activities.xlsx')
+PARTITIONS_DIR = os.path.join(DATA_DIR, 'partitions')
+# Classeurs d'activités : un fichier, un dossier ou un motif glob (ex. data/activities*.xlsx)
+ACTIVITY_SOURCES = os.environ.get('ACTIVITY_SOURCES', ACTIVITIES_PATH)
+# Taille des blocs de lignes lus puis écrits lors de l'ingestion en flux
+BLOCK_ROWS = 50_000
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _cache_paths(source):
+    # Le dossier source est haché pour que deux classeurs de même nom ne partagent pas le cache
+    name = os.path.splitext(os.path.basename(source))[0]
+    folder = hashlib.sha256(os.path.dirname(os.path.abspath(source)).encode()).hexdigest()[:8]
+    return os.path.join(CACHE_DIR, f'{name}-{folder}.arrow'), os.path.join(CACHE_DIR, f'{name}-{folder}.json')
+
+
+def _is_fresh(source, meta_path):
+    # Le cache est valide si la taille et la date de modification n'ont pas changé ;
+    # sinon on compare l'empreinte du fichier (ex. copie ou checkout qui touche le mtime)
+    if not os.path.exists(meta_path):
+        return False
+    with open(meta_path, encoding='utf-8') as f:
+        meta = json.load(f)
+    stat = os.stat(source)
+    if meta.get('mtime_ns') == stat.st_mtime_ns and meta.get('size') == stat.st_size:
+        return True
+    if meta.get('sha256') != _file_hash(source):
+        return False
+    meta.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+    _write_meta(meta_path, meta)
+    return True
+
+
+def _write_meta(meta_path, meta):
+    def write(tmp_path):
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+
+    atomic_write(meta_path, write)
+
+
+def write_arrow(table, path):
+    def write(tmp_path):
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+    atomic_write(path, write)
+
+
+def read_arrow(path):
+    # Fichier Arrow IPC non compressé : les colonnes sont projetées en mémoire (mmap) sans copie
+    return pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+
+
+def read_villages(path=VILLAGES_PATH):
+    return pd.read_excel(path)
+
+
+def read_activities(path=ACTIVITIES_PATH):
+    if path.lower().endswith('.csv'):
+        activities = pd.read_csv(path)
+    else:
+        activities = pd.read_excel(path)
+
+    return _parse_dates(activities)
+
+
+def _parse_dates(activities):
+    # Chaque libellé distinct (ex. "Nov. 2023") est converti une seule fois en clé de mois entière ;
+    # les dates invalides (MISSING_KEY) sont mises en quarantaine par l'étape de validation
+    keys = parse_month_keys(activities['Date'])
+    activities = activities.reset_index(drop=True)
+    activities['Date'] = key_to_timestamp(keys)
+    activities['month_key'] = keys
+    activities['formatted_date'] = format_months(keys)
+    return activities
+
+
+def _excel_blocks(path, block_rows):
+    # Mode lecture seule d'openpyxl : les lignes sont lues au fil de l'eau, jamais tout le classeur
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
     try:
-        villages = pd.read_excel('data/map.xlsx')
-        
-        # Spécifiez le format des dates pour Pandas
-        activities = pd.read_excel('data/activities.xlsx', parse_dates=['Date'], date_parser=lambda x: pd.to_datetime(x, format='%b. %Y'))
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None) or ()
+        keep = [i for i, name in enumerate(header) if name is not None]
+        columns = [str(header[i]) for i in keep]
+        buffer = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            buffer.append([row[i] if i < len(row) else None for i in keep])
+            if len(buffer) >= block_rows:
+                yield pd.DataFrame(buffer, columns=columns)
+                buffer = []
+        yield pd.DataFrame(buffer, columns=columns)
+    finally:
+        workbook.close()
+
+
+def _csv_blocks(path, block_rows):
+    yielded = False
+    for block in pd.read_csv(path, chunksize=block_rows):
+        yielded = True
+        yield block
+    if not yielded:
+        yield pd.read_csv(path, nrows=0)
+
+
+def _type_block(block):
+    # Conversion vectorisée des dates du bloc ; types fixes pour que tous les blocs partagent le schéma Arrow
+    block = _parse_dates(validate_activities(block))
+    for column in block.columns.drop(['Date', 'month_key', NON_NUMERIC_COLUMN]):
+        values = block[column]
+        if column in COUNT_COLUMNS:
+            block[column] = pd.to_numeric(values, errors='coerce').astype('float64')
+        else:
+            block[column] = values.astype(str).where(values.notna(), None)
+    return block
+
+
+def activity_blocks(path, block_rows=BLOCK_ROWS):
+    """Blocs typés d'un classeur (Excel en lecture seule) ou d'un CSV, de `block_rows` lignes au plus."""
+    blocks = _csv_blocks(path, block_rows) if path.lower().endswith('.csv') else _excel_blocks(path, block_rows)
+    for block in blocks:
+        yield _type_block(block)
+
+
+def _arrow_type(column):
+    if column == 'Date':
+        return pa.timestamp('ns')
+    if column == 'month_key':
+        return pa.int32()
+    if column == NON_NUMERIC_COLUMN:
+        return pa.bool_()
+    if column in COUNT_COLUMNS:
+        return pa.float64()
+    return pa.string()
 
-        # Optionnel : supprimez les lignes avec des dates invalides (NaN)
-        activities = activities.dropna(subset=['Date'])
 
-        # Formatage de la date comme souhaité
-        activities['formatted_date'] = activities['Date'].dt.strftime('%b. %Y')
+def write_arrow_blocks(blocks, path):
+    """Écrit les blocs les uns après les autres : la mémoire reste bornée par la taille d'un bloc."""
+    def write(tmp_path):
+        writer = None
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            for block in blocks:
+                if writer is None:
+                    schema = pa.schema([(column, _arrow_type(column)) for column in block.columns])
+                    writer = pa.ipc.new_file(sink, schema)
+                writer.write_table(pa.Table.from_pandas(block, schema=schema, preserve_index=False))
+            if writer is None:
+                raise ValueError(f"Aucune donnée lue dans {path}")
+            writer.close()
 
+    atomic_write(path, write)
+
+
+def _ingest(source, write, force):
+    arrow_path, meta_path = _cache_paths(source)
+    if not force and os.path.exists(arrow_path) and _is_fresh(source, meta_path):
+        return arrow_path
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    write(arrow_path)
+    stat = os.stat(source)
+    _write_meta(meta_path, {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': _file_hash(source)})
+    return arrow_path
+
+
+def ingest(source, reader, force=False):
+    """Convertit un classeur Excel en fichier Arrow typé, reconstruit seulement si la source a changé."""
+    return _ingest(source, lambda path: write_arrow(pa.Table.from_pandas(reader(source), preserve_index=False), path), force)
+
+
+def ingest_stream(source, block_rows=BLOCK_ROWS, force=False):
+    """Ingestion en flux d'un classeur d'activités vers le cache Arrow, à mémoire bornée."""
+    return _ingest(source, lambda path: write_arrow_blocks(activity_blocks(source, block_rows), path), force)
+
+
+def load_table(source, reader):
+    with stage(f'load:{os.path.basename(source)}') as info:
+        try:
+            arrow_path = ingest(source, reader)
+            table = read_arrow(arrow_path).to_pandas()
+        except (pa.ArrowException, OSError):
+            # Cache indisponible (types mixtes, disque en lecture seule...) : lecture directe du classeur
+            table = reader(source)
+        info['rows'] = len(table)
+    return table
+
+
+def load_typed_table(source, reader):
+    # Schéma compact appliqué une seule fois au chargement, avec le rapport mémoire par colonne
+    raw = load_table(source, reader)
+    typed = apply_schema(raw)
+    logger.info("Schéma appliqué à %s :\n%s", source, memory_report(raw, typed).to_string())
+    return typed
+
+
+def partition_files():
+    # Lots mensuels ajoutés par ingest.append_batch, un dossier par mois (month=AAAA-MM)
+    return sorted(glob.glob(os.path.join(PARTITIONS_DIR, 'month=*', 'part-*.arrow')))
+
+
+def activity_sources(spec=None):
+    """Liste triée des classeurs d'activités désignés par un fichier, un dossier ou un motif glob."""
+    spec = spec or ACTIVITY_SOURCES
+    if os.path.isdir(spec):
+        paths = glob.glob(os.path.join(spec, '*.xlsx')) + glob.glob(os.path.join(spec, '*.csv'))
+    elif glob.has_magic(spec):
+        paths = glob.glob(spec)
+    else:
+        paths = [spec]
+    return sorted(path for path in paths if not os.path.basename(path).startswith('~$'))
+
+
+def _ingest_activities(path):
+    # Lecture en flux, validation et typage par blocs, exécutés dans le processus de travail
+    return ingest_stream(path)
+
+
+def _is_cached(source):
+    arrow_path, meta_path = _cache_paths(source)
+    return os.path.exists(arrow_path) and _is_fresh(source, meta_path)
+
+
+def load_activities(spec=None, max_workers=None, zones=None):
+    """Charge tous les classeurs d'activités ; les classeurs modifiés sont analysés en parallèle.
+
+    Chaque processus de travail écrit directement le cache Arrow de son classeur : le processus
+    principal ne fait que projeter ces fichiers en mémoire puis les concaténer. Les lignes invalides
+    (voir quality.RULES) sont ensuite mises en quarantaine, les zones connues étant lues dans map.xlsx
+    si `zones` n'est pas fourni.
+    """
+    paths = activity_sources(spec)
+    stale = [path for path in paths if not _is_cached(path)]
+    with stage('load:activities') as info:
+        if len(stale) > 1:
+            workers = min(len(stale), max_workers or os.cpu_count() or 1)
+            # spawn plutôt que fork : le processus Streamlit est multi-threadé (serveur, rafraîchissement)
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+                list(pool.map(_ingest_activities, stale))
+        else:
+            for path in stale:
+                _ingest_activities(path)
+        frames = [read_arrow(_cache_paths(path)[0]).to_pandas() for path in paths]
+        raw = pd.concat(frames, ignore_index=True)
+        activities = apply_schema(raw)
+        info['rows'] = len(activities)
+    logger.info("Schéma appliqué aux activités (%s classeur(s)) :\n%s", len(paths), memory_report(raw, activities).to_string())
+    if zones is None:
+        zones = load_table(VILLAGES_PATH, read_villages)['ZONE'].unique()
+    with stage('validate') as info:
+        activities = quarantine(activities, zones)
+        info['rows'] = len(activities)
+    return activities
+
+
+def data_version(sources=None):
+    # Identifiant léger de la version des données, dérivé de la taille et du mtime des sources
+    # et de la version des règles de qualité (qui décident des lignes retenues)
+    if sources is None:
+        sources = [VILLAGES_PATH] + activity_sources() + partition_files()
+    digest = hashlib.sha256(f'rules:{RULES_VERSION};'.encode())
+    for source in sources:
+        stat = os.stat(source)
+        digest.update(f'{source}:{stat.st_size}:{stat.st_mtime_ns};'.encode())
+    return digest.hexdigest()[:16]
+
+
+def load_data():
+    # Streamlit n'est importé qu'ici : les modules sans interface (query, build...) ne le chargent pas.
+    # st.cache_data identifie la fonction par son nom et son code, le cache est donc partagé entre les appels
+    import streamlit as st
+
+    return st.cache_data(_load_data)()
+
+
+def _load_data():
+    import streamlit as st
+
+    try:
+        villages = load_typed_table(VILLAGES_PATH, read_villages)
+        activities = load_activities()
         return villages, activities
     except Exception as e:
         st.error(f"Erreur de chargement des données : {e}")
         return None, None
+
+
+if __name__ == '__main__':
+    # Étape d'ingestion : python data_loader.py
+    print(ingest(VILLAGES_PATH, read_villages, force=True))
+    for source in activity_sources():
+        print(ingest_stream(source, force=True))
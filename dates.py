@@ -0,0 +1,77 @@
+import functools
+
+import numpy as np
+import pandas as pd
+
+# Format des dates des classeurs d'activités (ex. "Nov. 2023")
+DATE_FORMAT = '%b. %Y'
+MONTHS_FR = ['janv.', 'févr.', 'mars', 'avr.', 'mai', 'juin', 'juil.', 'août', 'sept.', 'oct.', 'nov.', 'déc.']
+
+# Clé de mois entière : année * 12 + (mois - 1) ; -1 pour une date absente ou invalide
+MISSING_KEY = -1
+_EPOCH_KEY = 1970 * 12
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_month(value, fmt):
+    if isinstance(value, str):
+        timestamp = pd.to_datetime(value.strip(), format=fmt, errors='coerce')
+    else:
+        timestamp = pd.to_datetime(value, errors='coerce')
+    if pd.isna(timestamp):
+        return MISSING_KEY
+    return timestamp.year * 12 + timestamp.month - 1
+
+
+def parse_month_keys(values, fmt=DATE_FORMAT):
+    """Clés de mois des valeurs brutes ; chaque valeur distincte n'est convertie qu'une fois (cache)."""
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+    lookup = np.array([_parse_month(value, fmt) for value in uniques] + [MISSING_KEY], dtype=np.int32)
+    # Le code -1 des valeurs manquantes pointe sur le dernier élément (MISSING_KEY)
+    return lookup[codes]
+
+
+def month_key(dates):
+    """Clés de mois d'une série de dates (opération entière vectorisée)."""
+    values = pd.to_datetime(pd.Series(dates)).to_numpy()
+    keys = values.astype('datetime64[M]').astype(np.int64) + _EPOCH_KEY
+    return np.where(np.isnat(values), MISSING_KEY, keys).astype(np.int32)
+
+
+def month_bound(value, ceil=False):
+    """Clé du mois d'une borne de date ; avec `ceil`, un jour en cours de mois renvoie le mois suivant."""
+    if not value:
+        return None
+    timestamp = pd.Timestamp(value)
+    key = timestamp.year * 12 + timestamp.month - 1
+    if ceil and timestamp > pd.Timestamp(timestamp.year, timestamp.month, 1):
+        key += 1
+    return key
+
+
+def key_to_timestamp(keys):
+    """Premier jour du mois de chaque clé (NaT pour MISSING_KEY)."""
+    keys = np.asarray(keys, dtype=np.int64)
+    months = (keys - _EPOCH_KEY).astype('datetime64[M]').astype('datetime64[ns]')
+    return pd.DatetimeIndex(np.where(keys == MISSING_KEY, np.datetime64('NaT'), months))
+
+
+def month_labels(keys):
+    """Table des libellés par clé de mois : début du mois, période, libellés source et français."""
+    keys = np.unique(np.asarray(keys, dtype=np.int32))
+    keys = keys[keys != MISSING_KEY]
+    starts = key_to_timestamp(keys)
+    return pd.DataFrame({
+        'start': starts,
+        'period': starts.strftime('%Y-%m'),
+        'label': starts.strftime(DATE_FORMAT),
+        'label_fr': [f'{MONTHS_FR[key % 12]} {key // 12}' for key in keys],
+    }, index=pd.Index(keys, name='month_key'))
+
+
+def format_months(keys, column='label'):
+    """Libellés de mois sous forme catégorielle, calculés une fois par mois distinct."""
+    keys = np.asarray(keys, dtype=np.int32)
+    labels = month_labels(keys)[column]
+    # MISSING_KEY est absent de la table : get_indexer renvoie -1, soit une valeur manquante
+    return pd.Categorical.from_codes(labels.index.get_indexer(keys), categories=labels.to_numpy())
@@ -0,0 +1,40 @@
+import numpy as np
+
+from lru import BoundedLRU
+
+# Taille estimée de la partie fixe d'une figure (mise en page, thème), ajoutée aux valeurs de ses traces
+FIGURE_OVERHEAD = 8 * 2 ** 10
+TRACE_PROPERTIES = ('x', 'y', 'values', 'labels', 'text', 'customdata')
+
+
+def figure_bytes(figure):
+    """Taille approximative d'une figure en mémoire, estimée sans la sérialiser en JSON."""
+    size = FIGURE_OVERHEAD
+    for trace in figure.data:
+        for name in TRACE_PROPERTIES:
+            values = trace[name] if name in trace else None
+            if values is not None:
+                size += values.nbytes if isinstance(values, np.ndarray) else 8 * len(values)
+    return size
+
+
+class FigureCache(BoundedLRU):
+    """Cache LRU des figures Plotly, borné en nombre d'entrées et en octets (estimés par figure_bytes).
+
+    Partagé par toutes les sessions du processus ; les figures mises en cache ne doivent pas être modifiées.
+    st.plotly_chart sérialise lui-même la figure : le cache conserve l'objet, pas son JSON.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=64 * 2 ** 20):
+        super().__init__(max_entries, max_bytes, figure_bytes)
+
+    def figure(self, key, build):
+        """Figure pour `key`, construite par `build()` au premier appel."""
+        figure = self.get(key)
+        if figure is None:
+            figure = self.put(key, build())
+        return figure
+
+
+# Instance unique par processus, partagée par toutes les sessions Streamlit
+figure_cache = FigureCache()
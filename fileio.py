@@ -0,0 +1,19 @@
+import os
+import uuid
+
+
+def atomic_write(path, write):
+    """Écrit `path` via `write(chemin temporaire)` puis renommage atomique.
+
+    Le fichier temporaire est propre à l'appel (même dossier, suffixe aléatoire) : plusieurs processus
+    peuvent écrire le même fichier sans tronquer le fichier temporaire d'un autre, et un lecteur ne voit
+    jamais qu'un fichier complet.
+    """
+    tmp_path = f'{path}.{uuid.uuid4().hex[:12]}.tmp'
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
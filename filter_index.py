@@ -0,0 +1,211 @@
+import numpy as np
+import pandas as pd
+
+from dates import month_bound, month_key
+from lru import BoundedLRU
+
+SEX_COLUMNS = {
+    'M': ['M'],
+    'F': ['F'],
+}
+
+AGE_GROUP_COLUMNS = {
+    '-18': ['-18|HOMME', '-18|FEMME'],
+    '18-24': ['18-24|HOMME', '18-24|FEMME'],
+    '25-35': ['25-35|HOMME', '25-35|FEMME'],
+    '35+': ['35|HOMME', '35|FEMME'],
+}
+
+
+def filter_key(zone=None, sexe=None, age_group=None, activity_type=None, start_date=None, end_date=None):
+    """Tuple normalisé de l'état des filtres, utilisable comme clé de cache.
+
+    Les dates sont mensuelles : deux curseurs dans le même intervalle de mois donnent la même clé.
+    """
+    return (
+        str(zone) if zone else None,
+        sexe if sexe in SEX_COLUMNS else None,
+        age_group if age_group in AGE_GROUP_COLUMNS else None,
+        str(activity_type) if activity_type else None,
+        month_bound(start_date, ceil=True),
+        month_bound(end_date),
+    )
+
+
+def _presence_bitmap(df, columns):
+    # Une ligne est retenue si la somme des colonnes est positive (NaN compté comme 0)
+    return np.packbits(df[columns].fillna(0).sum(axis=1).to_numpy() > 0)
+
+
+def _value_bitmaps(values):
+    codes, uniques = pd.factorize(values, sort=True)
+    return {value: np.packbits(codes == code) for code, value in enumerate(uniques)}
+
+
+def _append_bits(bitmap, size, bits):
+    # Bits ajoutés en fin de bitmap : seul le dernier octet incomplet de l'ancien bitmap est dépaqueté
+    full = size // 8
+    head = np.unpackbits(bitmap[full:full + 1], count=size % 8)
+    return np.concatenate([bitmap[:full], np.packbits(np.concatenate([head, bits]))])
+
+
+def _bits(bitmap, positions):
+    # Lecture des bits des seules positions demandées, sans dépaqueter tout le bitmap
+    return (bitmap[positions >> 3] >> (7 - (positions & 7)).astype(np.uint8)) & 1 == 1
+
+
+class FilterIndex:
+    """Bitmaps précalculés par valeur de filtre, construits une fois par version des données.
+
+    Chaque bitmap contient un bit par ligne de la table fusionnée ; une combinaison de filtres
+    de la barre latérale se résout par intersection de bitmaps, puis une seule sélection de lignes.
+    """
+
+    # Bitmaps par famille de filtre, dans l'ordre d'écriture des artefacts (voir artifacts.py)
+    BITMAP_GROUPS = ['zones', 'activities', 'sexes', 'age_groups', 'months']
+
+    def __init__(self, df):
+        self._init_size(len(df))
+        self.zones = _value_bitmaps(df['ZONE'])
+        self.activities = _value_bitmaps(df['Activité'])
+        self.sexes = {sexe: _presence_bitmap(df, columns) for sexe, columns in SEX_COLUMNS.items()}
+        self.age_groups = {group: _presence_bitmap(df, columns) for group, columns in AGE_GROUP_COLUMNS.items()}
+        keys = df['month_key'] if 'month_key' in df.columns else month_key(df['Date'])
+        self.row_months = np.asarray(keys, dtype=np.int32)
+        self.months = _value_bitmaps(keys)
+        self._month_keys = np.array(list(self.months), dtype=np.int32)
+
+    def _init_size(self, size):
+        self.size = size
+        self._all = np.packbits(np.ones(size, dtype=bool))
+        self._empty = np.zeros_like(self._all)
+
+    @classmethod
+    def from_bitmaps(cls, size, row_months, bitmaps):
+        """Reconstruit un index à partir de bitmaps déjà calculés (ex. projetés en mémoire depuis le disque)."""
+        index = cls.__new__(cls)
+        index._init_size(size)
+        index.row_months = row_months
+        for group in cls.BITMAP_GROUPS:
+            setattr(index, group, bitmaps[group])
+        index._month_keys = np.array(list(index.months), dtype=np.int32)
+        return index
+
+    def append(self, df):
+        """Nouvel index avec les lignes de `df` ajoutées en fin de table ; les bitmaps existants sont prolongés."""
+        other = FilterIndex(df)
+        index = FilterIndex.__new__(FilterIndex)
+        index._init_size(self.size + other.size)
+        index.row_months = np.concatenate([self.row_months, other.row_months])
+        for group in self.BITMAP_GROUPS:
+            old, new = getattr(self, group), getattr(other, group)
+            bitmaps = {}
+            for key in list(old) + [key for key in new if key not in old]:
+                bits = np.unpackbits(new.get(key, other._empty), count=other.size)
+                bitmaps[key] = _append_bits(old.get(key, self._empty), self.size, bits)
+            setattr(index, group, bitmaps)
+        index._month_keys = np.array(list(index.months), dtype=np.int32)
+        return index
+
+    def _date_bitmap(self, start_date, end_date):
+        # Comparaisons entières sur les clés de mois
+        selected = np.ones(len(self._month_keys), dtype=bool)
+        if start_date:
+            selected &= self._month_keys >= month_bound(start_date, ceil=True)
+        if end_date:
+            selected &= self._month_keys <= month_bound(end_date)
+        if not selected.any():
+            return self._empty
+        return np.bitwise_or.reduce([self.months[key] for key in self._month_keys[selected]])
+
+    def mask(self, zone=None, sexe=None, age_group=None, activity_type=None, start_date=None, end_date=None):
+        bitmap = self._all
+        if zone:
+            bitmap = bitmap & self.zones.get(zone, self._empty)
+        if sexe in self.sexes:
+            bitmap = bitmap & self.sexes[sexe]
+        if age_group in self.age_groups:
+            bitmap = bitmap & self.age_groups[age_group]
+        if activity_type:
+            bitmap = bitmap & self.activities.get(activity_type, self._empty)
+        if start_date or end_date:
+            bitmap = bitmap & self._date_bitmap(start_date, end_date)
+        return np.unpackbits(bitmap, count=self.size).astype(bool)
+
+    def select(self, zone=None, sexe=None, age_group=None, activity_type=None, start_date=None, end_date=None):
+        """Renvoie les positions des lignes correspondant à la combinaison de filtres."""
+        return np.flatnonzero(self.mask(zone, sexe, age_group, activity_type, start_date, end_date))
+
+    def refine(self, positions, zone=None, sexe=None, age_group=None, activity_type=None,
+               start_key=None, end_key=None):
+        """Restreint des positions déjà sélectionnées : seules ces lignes sont examinées."""
+        keep = np.ones(len(positions), dtype=bool)
+        if zone:
+            keep &= _bits(self.zones.get(zone, self._empty), positions)
+        if sexe in self.sexes:
+            keep &= _bits(self.sexes[sexe], positions)
+        if age_group in self.age_groups:
+            keep &= _bits(self.age_groups[age_group], positions)
+        if activity_type:
+            keep &= _bits(self.activities.get(activity_type, self._empty), positions)
+        if start_key is not None:
+            keep &= self.row_months[positions] >= start_key
+        if end_key is not None:
+            keep &= self.row_months[positions] <= end_key
+        return positions[keep]
+
+
+def _refines(key, cached):
+    # `key` est un raffinement de `cached` si chaque filtre posé par `cached` l'est aussi, à l'identique
+    # ou (pour les dates) sur une plage incluse
+    for value, cached_value in zip(key[:4], cached[:4]):
+        if cached_value is not None and value != cached_value:
+            return False
+    start, end = key[4:]
+    cached_start, cached_end = cached[4:]
+    if cached_start is not None and (start is None or start < cached_start):
+        return False
+    if cached_end is not None and (end is None or end > cached_end):
+        return False
+    return True
+
+
+class SelectionCache(BoundedLRU):
+    """Cache LRU des sélections de lignes par combinaison de filtres (moteur pandas de query.py).
+
+    Une requête qui raffine une sélection en cache (zone puis type d'activité puis plage plus courte...)
+    n'examine que les lignes de la plus petite sélection englobante au lieu de toute la table.
+    Même interface `select` que FilterIndex : utilisable comme `index` de `filter_data`.
+    """
+
+    def __init__(self, index, max_entries=128, max_bytes=32 * 2 ** 20):
+        super().__init__(max_entries, max_bytes, lambda positions: positions.nbytes)
+        self.index = index
+        # Sélections absentes du cache mais calculées à partir d'une sélection englobante
+        self.refinements = 0
+
+    def _parent(self, key):
+        candidates = [(len(positions), cached, positions) for cached, positions in self.items() if _refines(key, cached)]
+        if not candidates:
+            return None, None
+        _, parent, positions = min(candidates, key=lambda candidate: candidate[0])
+        return parent, positions
+
+    def select(self, zone=None, sexe=None, age_group=None, activity_type=None, start_date=None, end_date=None):
+        key = filter_key(zone, sexe, age_group, activity_type, start_date, end_date)
+        positions = self.get(key)
+        if positions is not None:
+            return positions
+
+        parent, base = self._parent(key)
+        if base is not None:
+            # Seuls les filtres absents de la sélection englobante sont évalués
+            extra = [value if value != cached else None for value, cached in zip(key[:4], parent[:4])]
+            positions = self.index.refine(base, *extra,
+                                          start_key=key[4] if key[4] != parent[4] else None,
+                                          end_key=key[5] if key[5] != parent[5] else None)
+            self.refinements += 1
+        else:
+            positions = self.index.select(*key[:4], start_date, end_date)
+        positions.setflags(write=False)
+        return self.put(key, positions)
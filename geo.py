@@ -0,0 +1,136 @@
+import functools
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from data_loader import CACHE_DIR, DATA_DIR, read_arrow, write_arrow
+from tracing import lazy_import
+
+# Fichier local des limites administratives (shapefile ou GeoPackage), une entité par région
+BOUNDARIES_PATH = os.path.join(DATA_DIR, 'boundaries.gpkg')
+REGION_NAME_COLUMN = 'Régions'
+
+
+def _normalize(names):
+    return names.astype(str).str.strip().str.casefold()
+
+
+def read_boundaries(path=BOUNDARIES_PATH):
+    """Polygones des régions en WGS84, ou None si aucun fichier de limites n'est disponible."""
+    if not os.path.exists(path):
+        return None
+    import geopandas as gpd
+
+    regions = gpd.read_file(path)
+    if regions.crs is not None and regions.crs.to_epsg() != 4326:
+        regions = regions.to_crs(epsg=4326)
+    return pd.DataFrame({
+        'Régions': regions[REGION_NAME_COLUMN].astype(str).to_numpy(),
+        'geometry': np.asarray(regions.geometry.to_wkb()),
+    })
+
+
+def _signature(villages, path):
+    digest = hashlib.sha256(pd.util.hash_pandas_object(villages, index=False).values.tobytes())
+    if os.path.exists(path):
+        stat = os.stat(path)
+        digest.update(f'{stat.st_size}:{stat.st_mtime_ns}'.encode())
+    return digest.hexdigest()[:16]
+
+
+def _resolve(villages, regions):
+    villages = villages.copy()
+    for column in ('latitude', 'longitude'):
+        if column not in villages.columns:
+            villages[column] = np.nan
+    villages['region_boundary'] = None
+    if regions is None:
+        return villages
+
+    shapely = lazy_import('shapely')
+    # Région de chaque village géolocalisé : point dans polygone via l'index STRtree des régions
+    polygons = shapely.from_wkb(regions['geometry'].to_numpy())
+    located = villages['latitude'].notna() & villages['longitude'].notna()
+    points = shapely.points(villages.loc[located, 'longitude'].to_numpy(), villages.loc[located, 'latitude'].to_numpy())
+    point_idx, region_idx = shapely.STRtree(polygons).query(points, predicate='within')
+    villages.loc[villages.index[located][point_idx], 'region_boundary'] = regions['Régions'].to_numpy()[region_idx]
+
+    # Villages sans coordonnées : point représentatif du polygone de leur région (jointure par nom)
+    if 'Régions' in villages.columns:
+        anchors = shapely.point_on_surface(polygons)
+        by_name = pd.Series(np.arange(len(regions)), index=_normalize(regions['Régions']))
+        by_name = by_name[~by_name.index.duplicated()]
+        match = _normalize(villages['Régions']).map(by_name)
+        missing = ~located & match.notna()
+        anchor_idx = match[missing].astype(int).to_numpy()
+        villages.loc[missing, 'longitude'] = shapely.get_x(anchors[anchor_idx])
+        villages.loc[missing, 'latitude'] = shapely.get_y(anchors[anchor_idx])
+        villages.loc[missing, 'region_boundary'] = regions['Régions'].to_numpy()[anchor_idx]
+    return villages
+
+
+def resolve_villages(villages, boundaries_path=BOUNDARIES_PATH):
+    """Coordonnées et région de chaque village, mises en cache sur disque avec les polygones des régions.
+
+    Renvoie (villages résolus, régions) ; les régions valent None sans fichier de limites.
+    """
+    signature = _signature(villages, boundaries_path)
+    villages_path = os.path.join(CACHE_DIR, f'geo-villages-{signature}.arrow')
+    regions_path = os.path.join(CACHE_DIR, f'geo-regions-{signature}.arrow')
+    if os.path.exists(villages_path):
+        regions = read_arrow(regions_path).to_pandas() if os.path.exists(regions_path) else None
+        return read_arrow(villages_path).to_pandas(), regions
+
+    regions = read_boundaries(boundaries_path)
+    resolved = _resolve(villages, regions)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    if regions is not None:
+        write_arrow(pa.Table.from_pandas(regions, preserve_index=False), regions_path)
+    write_arrow(pa.Table.from_pandas(resolved, preserve_index=False), villages_path)
+    return resolved, regions
+
+
+class GeoIndex:
+    """Index spatial STRtree des villages (et des régions) pour les requêtes de la carte.
+
+    Les arbres sont construits à la première requête spatiale : shapely n'est pas importé au démarrage.
+    """
+
+    def __init__(self, villages, regions=None):
+        self.villages = villages.dropna(subset=['latitude', 'longitude']).reset_index(drop=True)
+        self.regions = regions
+
+    @functools.cached_property
+    def tree(self):
+        shapely = lazy_import('shapely')
+        return shapely.STRtree(shapely.points(self.villages['longitude'].to_numpy(), self.villages['latitude'].to_numpy()))
+
+    @functools.cached_property
+    def region_tree(self):
+        if self.regions is None:
+            return None
+        shapely = lazy_import('shapely')
+        return shapely.STRtree(shapely.from_wkb(self.regions['geometry'].to_numpy()))
+
+    def in_bbox(self, min_lon, min_lat, max_lon, max_lat):
+        return self.in_area(lazy_import('shapely').box(min_lon, min_lat, max_lon, max_lat))
+
+    def in_area(self, area):
+        """Villages situés dans une géométrie (ex. polygone dessiné sur la carte)."""
+        return self.villages.iloc[np.sort(self.tree.query(area, predicate='intersects'))]
+
+    def zones_in(self, area):
+        return sorted(self.in_area(area)['ZONE'].astype(str).unique())
+
+    def region_of(self, longitudes, latitudes):
+        """Nom de la région contenant chaque point (None hors des limites connues)."""
+        result = np.full(len(longitudes), None, dtype=object)
+        if self.region_tree is None:
+            return result
+        points = lazy_import('shapely').points(longitudes, latitudes)
+        point_idx, region_idx = self.region_tree.query(points, predicate='within')
+        result[point_idx] = self.regions['Régions'].to_numpy()[region_idx]
+        return result
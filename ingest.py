@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from cube import CUBE_FORMAT, Cube
+from dates import format_months
+from data_loader import (
+    CACHE_DIR, PARTITIONS_DIR, _write_meta, partition_files, read_activities, read_arrow, write_arrow,
+)
+from fileio import atomic_write
+from kpi import DISTINCT_COLUMNS, HLL_PRECISION, KpiTable
+from quality import RULES_VERSION, quarantine
+from schema import apply_schema, validate_activities
+
+CUBES_DIR = os.path.join(CACHE_DIR, 'cubes')
+SKETCH_PARTS = ('offsets', 'buckets', 'ranks')
+
+
+def month_keys(df):
+    # Période « AAAA-MM » de chaque ligne, calculée une fois par mois distinct
+    return format_months(df['month_key'], 'period')
+
+
+def _rows_digest(rows):
+    return hashlib.sha256(pd.util.hash_pandas_object(rows, index=False).values.tobytes()).hexdigest()
+
+
+def _partition_dir(month):
+    return os.path.join(PARTITIONS_DIR, f'month={month}')
+
+
+def append_batch(path, villages=None):
+    """Ajoute un classeur ou CSV mensuel au stockage partitionné par mois.
+
+    Les zones connues sont lues dans `villages` s'il est fourni. Renvoie la liste des mois modifiés ;
+    leurs agrégats sont recalculés à la version suivante (voir load_aggregates).
+    """
+    zones = villages['ZONE'].unique() if villages is not None else None
+    name = 'batch-' + os.path.splitext(os.path.basename(path))[0]
+    batch = quarantine(apply_schema(validate_activities(read_activities(path))), zones, name)
+    months = []
+    for month, rows in batch.groupby(month_keys(batch), sort=True, observed=True):
+        rows = rows.reset_index(drop=True)
+        part_path = os.path.join(_partition_dir(month), f'part-{_rows_digest(rows)[:16]}.arrow')
+        if os.path.exists(part_path):
+            # Lot déjà ingéré : on ne duplique pas les lignes
+            continue
+        os.makedirs(_partition_dir(month), exist_ok=True)
+        write_arrow(pa.Table.from_pandas(rows, preserve_index=False), part_path)
+        months.append(month)
+    return months
+
+
+def load_partitions(months=None):
+    """Lignes ajoutées par append_batch (toutes les partitions, ou seulement les mois demandés)."""
+    paths = partition_files()
+    if months is not None:
+        paths = [path for path in paths if os.path.basename(os.path.dirname(path))[len('month='):] in months]
+    if not paths:
+        return None
+    frames = [read_arrow(path).to_pandas() for path in paths]
+    return apply_schema(pd.concat(frames, ignore_index=True))
+
+
+def _month_signature(month, base_version):
+    # Les agrégats d'un mois dépendent de la version des classeurs (villages, activités, règles de qualité)
+    # et des lots ajoutés pour ce mois
+    digest = hashlib.sha256(f'{CUBE_FORMAT}:{HLL_PRECISION}:{RULES_VERSION}:{base_version}'.encode())
+    for path in partition_files():
+        if os.path.basename(os.path.dirname(path)) == f'month={month}':
+            digest.update(os.path.basename(path).encode())
+    return digest.hexdigest()
+
+
+def _write_sketches(sketches, path):
+    def write(tmp_path):
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **{f'{i}-{part}': values for i, sketch in enumerate(sketches.values())
+                           for part, values in zip(SKETCH_PARTS, sketch)})
+
+    atomic_write(path, write)
+
+
+def _read_sketches(path):
+    with np.load(path) as arrays:
+        return {column: tuple(arrays[f'{i}-{part}'] for part in SKETCH_PARTS) for i, column in enumerate(DISTINCT_COLUMNS)}
+
+
+def month_aggregates(month, rows, base_version):
+    """Cellules du cube et des indicateurs d'un mois, relues depuis le disque tant que leurs entrées n'ont pas changé.
+
+    `rows()` renvoie les lignes fusionnées du mois ; elle n'est appelée que si les agrégats sont à recalculer.
+    """
+    path = os.path.join(CUBES_DIR, f'month={month}')
+    signature = _month_signature(month, base_version)
+    if os.path.exists(f'{path}.json'):
+        with open(f'{path}.json', encoding='utf-8') as f:
+            if json.load(f).get('signature') == signature:
+                kpis = KpiTable.from_parts(read_arrow(f'{path}-kpi.arrow').to_pandas(), _read_sketches(f'{path}-kpi.npz'))
+                return read_arrow(f'{path}.arrow').to_pandas(), kpis
+
+    rows = rows()
+    cells, kpis = Cube(rows).cells, KpiTable(rows)
+    os.makedirs(CUBES_DIR, exist_ok=True)
+    write_arrow(pa.Table.from_pandas(cells, preserve_index=False), f'{path}.arrow')
+    write_arrow(pa.Table.from_pandas(kpis.cells, preserve_index=False), f'{path}-kpi.arrow')
+    _write_sketches(kpis.sketches, f'{path}-kpi.npz')
+    # La signature est écrite en dernier : elle ne désigne que des agrégats complets
+    _write_meta(f'{path}.json', {'signature': signature})
+    return cells, kpis
+
+
+def load_aggregates(data, base_version):
+    """Cube et indicateurs de la table fusionnée, assemblés à partir des agrégats mensuels mis en cache.
+
+    Après un ajout (append_batch), seuls les mois touchés par le lot sont recalculés : les autres
+    sont relus depuis le disque sans parcourir leurs lignes.
+    """
+    keys = data['month_key'].to_numpy()
+    months = np.sort(pd.unique(keys))
+    if not len(months):
+        return Cube(data), KpiTable(data)
+    cells, kpis = [], []
+    for key, month in zip(months, format_months(months, 'period')):
+        month_cells, month_kpis = month_aggregates(month, lambda: data[keys == key], base_version)
+        cells.append(month_cells)
+        kpis.append(month_kpis)
+    return Cube.from_cells(pd.concat(cells, ignore_index=True)), KpiTable.concat(kpis)
+
+
+if __name__ == '__main__':
+    # Ajout d'un lot mensuel : python ingest.py data/mai.xlsx
+    from data_loader import VILLAGES_PATH, load_typed_table, read_villages
+
+    villages = load_typed_table(VILLAGES_PATH, read_villages)
+    for batch_path in sys.argv[1:]:
+        print(batch_path, '->', append_batch(batch_path, villages) or 'déjà ingéré')
@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+
+from cube import DIMENSIONS, facts, slice_mask
+
+# Indicateurs additifs (sommes) et dénombrements distincts des tuiles de métriques
+SUM_COLUMNS = ["Nbre d'activité", 'Total Beneficiaire']
+DISTINCT_COLUMNS = ['Volontaire', 'Activité']
+
+# 2^11 registres par esquisse : erreur relative typique de 1,04 / sqrt(2048), soit environ 2 %
+HLL_PRECISION = 11
+
+
+def _hashes(values):
+    return pd.util.hash_pandas_object(values.astype(str), index=False).to_numpy()
+
+
+def _hll_pairs(values, precision):
+    # Registre (bits de poids fort) et rang du premier bit à 1 dans les 64 - precision bits restants ;
+    # les 53 bits de poids fort sont exacts en flottant, frexp donne donc leur longueur sans boucle Python
+    hashes = _hashes(values)
+    buckets = (hashes >> np.uint64(64 - precision)).astype(np.uint16)
+    rest = (hashes << np.uint64(precision)) >> np.uint64(11)
+    _, bit_length = np.frexp(rest.astype(np.float64))
+    ranks = np.where(rest == 0, 64 - precision + 1, 54 - bit_length).astype(np.uint8)
+    return buckets, ranks
+
+
+def hll_sparse(values, groups, n_groups, precision=HLL_PRECISION):
+    """Esquisses creuses de `n_groups` groupes : seuls les registres non nuls sont conservés.
+
+    Renvoie (offsets, buckets, ranks) : les paires (registre, rang maximal) du groupe g occupent
+    buckets[offsets[g]:offsets[g + 1]]. La taille suit le nombre de lignes et non 2^precision par groupe.
+    """
+    buckets, ranks = _hll_pairs(values, precision)
+    groups = np.asarray(groups, dtype=np.int64)
+    # Tri par (groupe, registre, rang) : la dernière paire de chaque (groupe, registre) porte le rang maximal
+    order = np.lexsort((ranks, buckets, groups))
+    groups, buckets, ranks = groups[order], buckets[order], ranks[order]
+    last = np.ones(len(groups), dtype=bool)
+    last[:-1] = (groups[1:] != groups[:-1]) | (buckets[1:] != buckets[:-1])
+    groups, buckets, ranks = groups[last], buckets[last], ranks[last]
+    offsets = np.zeros(n_groups + 1, dtype=np.int64)
+    np.cumsum(np.bincount(groups, minlength=n_groups), out=offsets[1:])
+    return offsets, buckets, ranks
+
+
+def hll_merge(sketch, mask, precision=HLL_PRECISION):
+    """Registres fusionnés (maximum) des groupes retenus par `mask` dans une esquisse creuse."""
+    offsets, buckets, ranks = sketch
+    registers = np.zeros(1 << precision, dtype=np.uint8)
+    if not mask.all():
+        # Positions des paires des seuls groupes retenus : le coût suit la sélection, pas la table
+        starts = offsets[:-1][mask]
+        counts = offsets[1:][mask] - starts
+        positions = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        buckets, ranks = buckets[positions], ranks[positions]
+    np.maximum.at(registers, buckets, ranks)
+    return registers
+
+
+def hll_estimate(registers):
+    """Cardinalité estimée d'une esquisse (registres déjà fusionnés)."""
+    m = registers.shape[-1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / np.sum(np.exp2(-registers.astype(np.float64)))
+    zeros = np.count_nonzero(registers == 0)
+    if estimate <= 2.5 * m and zeros:
+        # Correction des petites cardinalités (comptage linéaire)
+        estimate = m * np.log(m / zeros)
+    return int(round(estimate))
+
+
+class KpiTable:
+    """Sommes et esquisses de dénombrement distinct par cellule du cube, calculées au chargement.
+
+    Les esquisses HyperLogLog se fusionnent par maximum des registres : le nombre de volontaires
+    ou d'activités distincts d'une sélection quelconque de cellules s'obtient sans relire les lignes.
+    Une cellule ne compte souvent que quelques lignes : ses esquisses sont creuses (hll_sparse).
+    """
+
+    def __init__(self, df):
+        rows = facts(df)
+        groups = rows.groupby(DIMENSIONS, sort=True, observed=True, dropna=False)
+        cell_ids = groups.ngroup().to_numpy()
+        self.cells = groups.size().reset_index()[DIMENSIONS]
+        for column in SUM_COLUMNS:
+            self.cells[column] = df[column].fillna(0).astype('float64').groupby(cell_ids).sum().to_numpy()
+        present = [df[column].notna().to_numpy() for column in DISTINCT_COLUMNS]
+        self.sketches = {
+            column: hll_sparse(df[column][mask], cell_ids[mask], len(self.cells))
+            for column, mask in zip(DISTINCT_COLUMNS, present)
+        }
+
+    @classmethod
+    def from_parts(cls, cells, sketches):
+        """Reconstruit la table à partir de cellules et d'esquisses creuses déjà calculées."""
+        table = cls.__new__(cls)
+        table.cells = cells
+        table.sketches = sketches
+        return table
+
+    @classmethod
+    def concat(cls, tables):
+        """Table unique à partir de tables aux cellules disjointes (ex. une par mois), sans relire les lignes."""
+        cells = pd.concat([table.cells for table in tables], ignore_index=True)
+        sketches = {}
+        for column in DISTINCT_COLUMNS:
+            parts = [table.sketches[column] for table in tables]
+            # Les offsets de chaque table sont décalés du nombre de paires des tables précédentes
+            shifts = np.cumsum([0] + [offsets[-1] for offsets, _, _ in parts[:-1]])
+            offsets = np.concatenate([[0]] + [offsets[1:] + shift for (offsets, _, _), shift in zip(parts, shifts)])
+            sketches[column] = (
+                offsets.astype(np.int64),
+                np.concatenate([buckets for _, buckets, _ in parts]),
+                np.concatenate([ranks for _, _, ranks in parts]),
+            )
+        return cls.from_parts(cells.astype({'ZONE': 'category', 'Activité': 'category'}), sketches)
+
+    def summary(self, zone=None, sexe=None, age_group=None, activity_type=None, start_date=None, end_date=None):
+        """Indicateurs de la combinaison de filtres : sommes exactes et dénombrements distincts estimés."""
+        mask = slice_mask(self.cells, zone, sexe, age_group, activity_type, start_date, end_date).to_numpy()
+        result = {column: int(round(self.cells.loc[mask, column].sum())) for column in SUM_COLUMNS}
+        for column, sketch in self.sketches.items():
+            result[column] = hll_estimate(hll_merge(sketch, mask)) if mask.any() else 0
+        return result
+
+
+def format_count(value):
+    """Format compact des tuiles : 37542 → « 38K »."""
+    if value >= 1000:
+        return f'{value / 1000:.0f}K'
+    return str(value)
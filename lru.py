@@ -0,0 +1,58 @@
+import threading
+from collections import OrderedDict
+
+
+class BoundedLRU:
+    """Cache LRU partagé par les threads du processus, borné en nombre d'entrées et en octets.
+
+    `size(value)` donne la taille d'une valeur en octets, mesurée une fois à l'insertion ;
+    les entrées les moins récemment utilisées sont évincées dès qu'une des deux bornes est dépassée.
+    """
+
+    def __init__(self, max_entries, max_bytes, size):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = size
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Valeur en cache pour `key` (désormais la plus récente), ou None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """Met `value` en cache si `key` est absente ; renvoie la valeur en cache pour `key`."""
+        size = self.size(value)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                return entry[0]
+            self._entries[key] = (value, size)
+            self.bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self.bytes > self.max_bytes):
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+        return value
+
+    def items(self):
+        """Copie des paires (clé, valeur) en cache, de la moins à la plus récemment utilisée."""
+        with self._lock:
+            return [(key, value) for key, (value, _) in self._entries.items()]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
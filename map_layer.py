@@ -0,0 +1,57 @@
+import html
+
+import streamlit as st
+
+from tracing import lazy_import
+from utils import join_unique
+
+MAP_CENTER = [14.4974, -14.4524]
+
+# Les marqueurs sont créés côté navigateur à partir d'un seul tableau [lat, lon, popup]
+MARKER_CALLBACK = """
+function (row) {
+    var marker = L.marker(new L.LatLng(row[0], row[1]));
+    marker.bindPopup(row[2]);
+    return marker;
+}
+"""
+
+
+def map_points(zone_totals, villages):
+    """Un point par coordonnée de village, portant les totaux de sa zone.
+
+    `zone_totals` contient une ligne par ZONE (ex. `totals_by(cube_cells, 'ZONE')`) :
+    la taille de la couche dépend du nombre de villages, pas du nombre d'activités.
+    """
+    located = villages.dropna(subset=['latitude', 'longitude'])
+    points = located.groupby(['latitude', 'longitude', 'ZONE'], observed=True).agg(
+        {'Village': join_unique, 'Régions': join_unique}
+    ).reset_index()
+    # Les colonnes catégorielles restent catégorielles après l'agrégation : texte avant la concaténation
+    points = points.astype({'ZONE': str, 'Village': str, 'Régions': str})
+    totals = zone_totals.assign(ZONE=zone_totals['ZONE'].astype(str))
+    points = points.merge(totals, on='ZONE')
+    points['popup'] = (
+        'Zone : ' + points['ZONE'].map(html.escape)
+        + '<br>Villages : ' + points['Village'].map(html.escape)
+        + '<br>Régions : ' + points['Régions'].map(html.escape)
+        + '<br>Total Bénéficiaires (zone) : ' + points['Total Beneficiaire'].astype(str)
+    )
+    return points
+
+
+def build_map(points):
+    # folium n'est chargé qu'au premier affichage de la carte
+    folium = lazy_import('folium')
+    plugins = lazy_import('folium.plugins')
+    m = folium.Map(location=MAP_CENTER, zoom_start=6)
+    plugins.FastMarkerCluster(data=points[['latitude', 'longitude', 'popup']].values.tolist(), callback=MARKER_CALLBACK).add_to(m)
+    # Outils de dessin : la zone tracée est renvoyée par st_folium pour une requête spatiale
+    plugins.Draw(export=False, draw_options={'polyline': False, 'circle': False, 'marker': False, 'circlemarker': False}).add_to(m)
+    return m
+
+
+@st.cache_resource(max_entries=64)
+def cached_map(version, filter_state, _zone_totals, _villages):
+    # Une carte par (version des données, état des filtres) ; les arguments préfixés ne sont pas hachés
+    return build_map(map_points(_zone_totals, _villages))
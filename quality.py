@@ -0,0 +1,100 @@
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from dates import MISSING_KEY
+from fileio import atomic_write
+from filter_index import AGE_GROUP_COLUMNS
+from schema import COUNT_COLUMNS, NON_NUMERIC_COLUMN
+
+logger = logging.getLogger(__name__)
+
+QUARANTINE_DIR = os.path.join('data', 'quarantine')
+
+# Règles de qualité, vérifiées une fois au chargement ; une ligne qui en viole une est mise en quarantaine
+RULES = {
+    'date_invalide': "date absente ou illisible",
+    'effectif_non_numerique': "effectif non numérique",
+    'effectif_negatif': "effectif négatif",
+    'total_incoherent': "M + F différent de Total Beneficiaire",
+    'tranches_incoherentes': "somme des tranches d'âge différente de M ou de F",
+    'zone_inconnue': "ZONE absente de la table des villages",
+    'doublon': "ligne d'activité en double",
+}
+# À incrémenter quand les règles changent : les lignes retenues changent, les caches dérivés aussi
+RULES_VERSION = 2
+MALE_AGE_COLUMNS = [columns[0] for columns in AGE_GROUP_COLUMNS.values()]
+FEMALE_AGE_COLUMNS = [columns[1] for columns in AGE_GROUP_COLUMNS.values()]
+
+
+def _non_numeric(activities):
+    # Colonne absente des caches Arrow écrits avant la règle : ces classeurs n'avaient aucune valeur non numérique
+    if NON_NUMERIC_COLUMN not in activities.columns:
+        return np.zeros(len(activities), dtype=bool)
+    return activities[NON_NUMERIC_COLUMN].fillna(False).astype(bool).to_numpy()
+
+
+def check_activities(activities, zones=None):
+    """Tableau booléen (une colonne par règle) des violations de chaque ligne, calculé par colonnes entières."""
+    counts = activities[COUNT_COLUMNS].astype('float64').fillna(0).to_numpy()
+    column = {name: counts[:, i] for i, name in enumerate(COUNT_COLUMNS)}
+    males = counts[:, [COUNT_COLUMNS.index(name) for name in MALE_AGE_COLUMNS]].sum(axis=1)
+    females = counts[:, [COUNT_COLUMNS.index(name) for name in FEMALE_AGE_COLUMNS]].sum(axis=1)
+    checks = pd.DataFrame({
+        'date_invalide': activities['month_key'].to_numpy() == MISSING_KEY,
+        'effectif_non_numerique': _non_numeric(activities),
+        'effectif_negatif': (counts < 0).any(axis=1),
+        'total_incoherent': column['M'] + column['F'] != column['Total Beneficiaire'],
+        'tranches_incoherentes': (males != column['M']) | (females != column['F']),
+        'zone_inconnue': np.zeros(len(activities), dtype=bool),
+        # La première occurrence est conservée, les suivantes sont des doublons
+        'doublon': activities.duplicated(keep='first').to_numpy(),
+    }, index=activities.index)
+    if zones is not None:
+        checks['zone_inconnue'] = ~activities['ZONE'].astype(object).isin(set(zones)).to_numpy()
+    return checks
+
+
+def _write_quarantine(rejected, summary, name):
+    os.makedirs(QUARANTINE_DIR, exist_ok=True)
+
+    def write_rows(tmp_path):
+        rejected.to_csv(tmp_path, index=False, encoding='utf-8')
+
+    def write_summary(tmp_path):
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+    # Chaque processus charge les activités : fichiers temporaires uniques, renommage atomique
+    atomic_write(os.path.join(QUARANTINE_DIR, f'{name}.csv'), write_rows)
+    atomic_write(os.path.join(QUARANTINE_DIR, f'{name}.json'), write_summary)
+
+
+def quarantine(activities, zones=None, name='activities'):
+    """Étape de validation : renvoie les lignes valides, écrit les autres et un résumé dans data/quarantine/.
+
+    Les lignes rejetées portent la colonne `motifs` (règles violées, séparées par des virgules).
+    """
+    checks = check_activities(activities, zones)
+    invalid = checks.any(axis=1).to_numpy()
+    summary = {
+        'rows': len(activities),
+        'rejected': int(invalid.sum()),
+        'rules': {rule: {'rows': int(checks[rule].sum()), 'description': RULES[rule]} for rule in RULES},
+    }
+    rejected = activities[invalid].drop(columns=NON_NUMERIC_COLUMN, errors='ignore').astype({'ZONE': object, 'Activité': object})
+    motifs = pd.Series('', index=rejected.index)
+    for rule in RULES:
+        motifs += np.where(checks.loc[invalid, rule], f'{rule}, ', '')
+    rejected.insert(0, 'motifs', motifs.str.rstrip(', '))
+    try:
+        _write_quarantine(rejected, summary, name)
+    except OSError:
+        logger.exception("Impossible d'écrire la quarantaine %s", name)
+    if invalid.any():
+        logger.warning("%s ligne(s) sur %s mises en quarantaine (%s) : %s", summary['rejected'], summary['rows'], name,
+                       ', '.join(f"{rule}={info['rows']}" for rule, info in summary['rules'].items() if info['rows']))
+    return activities[~invalid].drop(columns=NON_NUMERIC_COLUMN, errors='ignore').reset_index(drop=True)
@@ -0,0 +1,116 @@
+"""Agrégats du tableau de bord sans Streamlit ni Plotly, pour les exports partenaires.
+
+    from query import aggregate_rows, render
+    aggregate_rows('activity', zone='ZC')          # DataFrame
+    render('month', 'csv', start_date='2024-01')   # octets prêts à servir
+"""
+import functools
+import io
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from backends import get_backend
+from dates import format_months, key_to_timestamp
+from filter_index import AGE_GROUP_COLUMNS, SEX_COLUMNS, filter_key
+from store import dataset_frame, serving_version
+
+# Agrégats exposés, identiques à ceux des graphiques du tableau de bord
+AGGREGATES = ['activity', 'month', 'sex', 'zone']
+CONTENT_TYPES = {
+    'json': 'application/json',
+    'csv': 'text/csv; charset=utf-8',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+class FilterError(ValueError):
+    """Valeur de filtre invalide : sexe ou tranche d'âge inconnus, date illisible."""
+
+
+def checked_key(zone=None, sexe=None, age_group=None, activity_type=None, start_date=None, end_date=None):
+    """Clé normalisée des filtres (filter_key), après vérification de leurs valeurs.
+
+    filter_key ignore une valeur inconnue ; une requête d'export doit au contraire la refuser
+    plutôt que renvoyer les totaux non filtrés.
+    """
+    if sexe and sexe not in SEX_COLUMNS:
+        raise FilterError(f"Sexe inconnu : {sexe} (disponibles : {', '.join(SEX_COLUMNS)})")
+    if age_group and age_group not in AGE_GROUP_COLUMNS:
+        raise FilterError(f"Tranche d'âge inconnue : {age_group} (disponibles : {', '.join(AGE_GROUP_COLUMNS)})")
+    for name, value in (('start_date', start_date), ('end_date', end_date)):
+        if value:
+            try:
+                pd.Timestamp(value)
+            except (TypeError, ValueError):
+                raise FilterError(f"Date illisible pour {name} : {value}") from None
+    return filter_key(zone, sexe, age_group, activity_type, start_date, end_date)
+
+
+@functools.lru_cache(maxsize=1)
+def _backend(version):
+    # Même table que le tableau de bord pour la même version (artefacts publiés, ou table fusionnée
+    # partagée, lots mensuels compris). Moteur choisi par QUERY_BACKEND : pandas en mémoire, ou
+    # moteur sur fichier (SQLite, DuckDB, Arrow, Polars) qui ne charge la table que pour écrire son fichier
+    return get_backend(lambda: dataset_frame(version), version)
+
+
+def _filters(key):
+    zone, sexe, age_group, activity_type, start_key, end_key = key
+    return {
+        'zone': zone, 'sexe': sexe, 'age_group': age_group, 'activity_type': activity_type,
+        'start_date': key_to_timestamp([start_key])[0] if start_key is not None else None,
+        'end_date': key_to_timestamp([end_key])[0] if end_key is not None else None,
+    }
+
+
+def _aggregate(name, backend, filters):
+    if name == 'activity':
+        result = backend.aggregate('Activité', 'Total Beneficiaire', **filters)
+        return result.sort_values('Total Beneficiaire', ascending=False, ignore_index=True)
+    if name == 'zone':
+        return backend.aggregate('ZONE', 'Total Beneficiaire', **filters)
+    if name == 'month':
+        result = backend.aggregate('month_key', 'Total Beneficiaire', **filters)
+        result.insert(0, 'month', format_months(result['month_key'], 'period').astype(str))
+        return result.drop(columns='month_key')
+    if name == 'sex':
+        totals = backend.totals(['M', 'F'], **filters)
+        return totals.rename({'M': 'Masculin', 'F': 'Féminin'}).rename_axis('Sexe').reset_index(name='Total Beneficiaire')
+    raise KeyError(f"Agrégat inconnu : {name} (disponibles : {', '.join(AGGREGATES)})")
+
+
+def aggregate_rows(name, zone=None, sexe=None, age_group=None, activity_type=None, start_date=None, end_date=None):
+    """Agrégat `name` pour la combinaison de filtres, sous forme de DataFrame (à ne pas modifier)."""
+    return _cached_rows(serving_version(), name, checked_key(zone, sexe, age_group, activity_type, start_date, end_date))
+
+
+@functools.lru_cache(maxsize=256)
+def _cached_rows(version, name, key):
+    return _aggregate(name, _backend(version), _filters(key))
+
+
+def _encode(df, fmt):
+    if fmt == 'json':
+        return df.to_json(orient='records', force_ascii=False).encode('utf-8')
+    if fmt == 'csv':
+        return df.to_csv(index=False).encode('utf-8')
+    if fmt == 'parquet':
+        buffer = io.BytesIO()
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), buffer)
+        return buffer.getvalue()
+    raise ValueError(f"Format inconnu : {fmt} (disponibles : {', '.join(CONTENT_TYPES)})")
+
+
+@functools.lru_cache(maxsize=256)
+def _cached_response(version, name, key, fmt):
+    return _encode(_cached_rows(version, name, key), fmt)
+
+
+def render(name, fmt='json', **filters):
+    """Agrégat sérialisé (JSON, CSV ou Parquet) ; la réponse est mise en cache par version et filtres."""
+    if fmt not in CONTENT_TYPES:
+        raise ValueError(f"Format inconnu : {fmt} (disponibles : {', '.join(CONTENT_TYPES)})")
+    key = checked_key(**filters)
+    return _cached_response(serving_version(), name, key, fmt)
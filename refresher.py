@@ -0,0 +1,80 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class Refresher:
+    """Rafraîchissement en arrière-plan avec service de la version précédente (stale-while-revalidate).
+
+    Un thread surveille `version()` ; quand la version change, `build(version)` est exécuté hors des
+    requêtes puis le résultat remplace l'ancien par une simple affectation (échange atomique).
+    Jusqu'à cet échange, `current()` continue de renvoyer la version précédente.
+    """
+
+    def __init__(self, build, version, interval=5.0):
+        self._build = build
+        self._version = version
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._value = None
+        self.loaded_version = None
+        self.last_error = None
+
+    def _load(self, version):
+        value = self._build(version)
+        with self._lock:
+            self._value = value
+            self.loaded_version = version
+        logger.info("Données rechargées (version %s)", version)
+        return value
+
+    def current(self):
+        """Valeur courante ; seul le tout premier appel attend la construction initiale."""
+        value = self._value
+        if value is not None:
+            return value
+        with self._lock:
+            if self._value is not None:
+                return self._value
+            version = self._version()
+            self._value = self._build(version)
+            self.loaded_version = version
+            return self._value
+
+    def refresh(self):
+        """Reconstruit si la version a changé ; renvoie True si un échange a eu lieu."""
+        if self.loaded_version is None:
+            # La construction initiale (current) n'est pas terminée : pas de seconde construction concurrente
+            return False
+        version = self._version()
+        if version == self.loaded_version:
+            return False
+        try:
+            self._load(version)
+            self.last_error = None
+        except Exception as e:
+            # On continue de servir la version précédente ; nouvelle tentative au prochain cycle
+            self.last_error = e
+            logger.exception("Échec du rechargement des données (version %s)", version)
+            return False
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Erreur de surveillance des données")
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='data-refresher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
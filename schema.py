@@ -0,0 +1,69 @@
+import pandas as pd
+
+from dates import key_to_timestamp, month_key
+from filter_index import AGE_GROUP_COLUMNS
+
+# Schéma déclaré des tables chargées : dimensions catégorielles, effectifs en entiers non signés
+# et dates ramenées au premier jour du mois, avec leur clé de mois entière (voir dates.py)
+DIMENSION_COLUMNS = ['ZONE', 'Activité', 'Régions', 'Volontaire', 'pays', 'formatted_date']
+COUNT_COLUMNS = ["Nbre d'activité", 'Total Beneficiaire', 'M', 'F'] + [
+    column for columns in AGE_GROUP_COLUMNS.values() for column in columns
+]
+REQUIRED_ACTIVITY_COLUMNS = ['Date', 'Volontaire', 'ZONE', 'Activité'] + COUNT_COLUMNS
+# Indicateur posé par validate_activities sur les lignes dont un effectif n'est pas numérique
+NON_NUMERIC_COLUMN = 'effectif_non_numerique'
+
+
+def _compact_counts(values):
+    # Les effectifs manquants comptent pour 0, comme dans les sommes des graphiques
+    values = pd.to_numeric(values, errors='coerce').fillna(0)
+    if (values % 1 != 0).any():
+        return values
+    if (values < 0).any():
+        return pd.to_numeric(values.astype('int64'), downcast='integer')
+    return pd.to_numeric(values.astype('uint64'), downcast='unsigned')
+
+
+def validate_activities(activities):
+    """Vérifie qu'une table d'activités respecte le schéma et convertit ses effectifs en nombres.
+
+    Seules les colonnes manquantes sont une erreur ; les lignes dont un effectif n'est pas numérique
+    sont marquées dans la colonne NON_NUMERIC_COLUMN et mises en quarantaine par quality.quarantine.
+    """
+    missing = [column for column in REQUIRED_ACTIVITY_COLUMNS if column not in activities.columns]
+    if missing:
+        raise ValueError(f"Colonnes manquantes : {', '.join(missing)}")
+    activities = activities.copy()
+    non_numeric = pd.Series(False, index=activities.index)
+    for column in COUNT_COLUMNS:
+        values = pd.to_numeric(activities[column], errors='coerce')
+        non_numeric |= values.isna() & activities[column].notna()
+        activities[column] = values
+    activities[NON_NUMERIC_COLUMN] = non_numeric
+    return activities
+
+
+def apply_schema(df):
+    """Applique le schéma déclaré aux colonnes présentes ; les autres colonnes sont laissées telles quelles."""
+    df = df.copy()
+    for column in df.columns.intersection(DIMENSION_COLUMNS):
+        df[column] = df[column].astype('category')
+    for column in df.columns.intersection(COUNT_COLUMNS):
+        df[column] = _compact_counts(df[column])
+    if 'Date' in df.columns:
+        df['month_key'] = month_key(df['Date'])
+        df['Date'] = key_to_timestamp(df['month_key'])
+    return df
+
+
+def memory_report(before, after):
+    """Mémoire par colonne (octets) avant et après application du schéma."""
+    report = pd.DataFrame({
+        'dtype_before': before.dtypes.astype(str),
+        'bytes_before': before.memory_usage(index=False, deep=True),
+        'dtype_after': after.dtypes.astype(str),
+        'bytes_after': after.memory_usage(index=False, deep=True),
+    })
+    report.loc['TOTAL', ['bytes_before', 'bytes_after']] = report[['bytes_before', 'bytes_after']].sum()
+    report['ratio'] = report['bytes_before'] / report['bytes_after']
+    return report
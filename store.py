@@ -0,0 +1,186 @@
+import contextlib
+import glob
+import os
+import threading
+
+import pyarrow as pa
+
+from artifacts import published_version, read_artifacts
+from cube import Cube
+from data_loader import (
+    CACHE_DIR, VILLAGES_PATH, activity_sources, data_version, load_activities, load_typed_table, read_arrow,
+    read_villages, write_arrow,
+)
+from filter_index import FilterIndex
+from geo import GeoIndex, resolve_villages
+from ingest import load_aggregates, load_partitions
+from kpi import KpiTable
+from refresher import Refresher
+from utils import merge_data
+
+# À incrémenter quand la construction de la table fusionnée change
+STORE_FORMAT = 3
+
+
+def _dataset_path(version):
+    return os.path.join(CACHE_DIR, f'dataset-v{STORE_FORMAT}-{version}.arrow')
+
+
+def _table_to_frame(table):
+    # split_blocks évite la consolidation : les colonnes numériques restent des vues
+    # en lecture seule sur le fichier projeté en mémoire, partagé entre processus via le cache disque
+    return table.to_pandas(split_blocks=True)
+
+
+def _base_version():
+    # Version des seuls classeurs (villages, activités) et des règles de qualité, sans les lots mensuels
+    return data_version([VILLAGES_PATH] + activity_sources())
+
+
+def _remove_stale(pattern, path):
+    # Un autre processus construisant la même version peut avoir déjà supprimé le fichier
+    for stale_path in glob.glob(os.path.join(CACHE_DIR, pattern)):
+        if stale_path != path:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(stale_path)
+
+
+def base_table(base):
+    """Table fusionnée des classeurs, sans les lots mensuels, écrite une fois par version des classeurs."""
+    path = os.path.join(CACHE_DIR, f'base-v{STORE_FORMAT}-{base}.arrow')
+    if not os.path.exists(path):
+        villages = load_typed_table(VILLAGES_PATH, read_villages)
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        write_arrow(pa.Table.from_pandas(merge_data(villages, load_activities()), preserve_index=False), path)
+        _remove_stale('base-*.arrow', path)
+    return read_arrow(path)
+
+
+def _partition_table(rows):
+    # Catégories en texte, comme les colonnes des classeurs ingérés en flux (voir data_loader._type_block) :
+    # un lot CSV peut lire en entiers des valeurs que la table des classeurs porte en texte
+    rows = rows.copy()
+    for column in rows.columns[rows.dtypes == 'category']:
+        rows[column] = rows[column].cat.rename_categories(str)
+    return pa.Table.from_pandas(rows, preserve_index=False)
+
+
+def shared_table(version, base=None):
+    """Table fusionnée en Arrow IPC, écrite une fois par version puis projetée en mémoire par chaque processus.
+
+    La table des classeurs (base_table) est suivie des lots mensuels (ingest.append_batch) : après un lot,
+    seuls les lots sont relus et fusionnés, puis concaténés à la table des classeurs déjà en cache.
+    """
+    path = _dataset_path(version)
+    if not os.path.exists(path):
+        tables = [base_table(base or _base_version())]
+        appended = load_partitions()
+        if appended is not None:
+            villages = load_typed_table(VILLAGES_PATH, read_villages)
+            tables.append(_partition_table(merge_data(villages, appended)))
+        # Types élargis au besoin (effectifs compacts de largeurs différentes), dictionnaires des catégories
+        # unifiés : le format fichier Arrow n'admet qu'un dictionnaire par colonne
+        table = pa.concat_tables(tables, promote_options='permissive').unify_dictionaries()
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        write_arrow(table, path)
+        _remove_stale('dataset-*.arrow', path)
+    return read_arrow(path)
+
+
+class Dataset:
+    """Jeu de données partagé en lecture seule par toutes les sessions d'un processus.
+
+    Les appelants ne doivent jamais modifier `data` ni `villages` : toute colonne dérivée
+    (coordonnées, mois...) est calculée dans un nouveau DataFrame.
+    """
+
+    def __init__(self, version, villages, data, cube=None, regions=None, filter_index=None, kpis=None):
+        self.version = version
+        self.villages = villages
+        self.data = data
+        self.geo_index = GeoIndex(villages, regions)
+        self.filter_index = filter_index if filter_index is not None else FilterIndex(data)
+        self.cube = cube if cube is not None else Cube(data)
+        self.kpis = kpis if kpis is not None else KpiTable(data)
+
+    @classmethod
+    def from_artifacts(cls, version, parts):
+        """Jeu de données projeté en mémoire depuis les artefacts construits par build.py."""
+        return cls(
+            version, parts['villages'], parts['data'],
+            cube=Cube.from_cells(parts['cube_cells']),
+            regions=parts['regions'],
+            filter_index=FilterIndex.from_bitmaps(parts['index_size'], parts['row_months'], parts['bitmaps']),
+            kpis=KpiTable.from_parts(parts['kpi_cells'], parts['sketches']),
+        )
+
+
+def dataset_frame(version):
+    """Table fusionnée d'une version, sans index ni agrégats : celle que sert le tableau de bord."""
+    parts = read_artifacts(version)
+    if parts is not None:
+        return parts['data']
+    return _table_to_frame(shared_table(version))
+
+
+def build_dataset(version):
+    # Déploiement multi-processus : les artefacts construits par build.py sont projetés en mémoire
+    # au lieu de recalculer fusion, index et agrégats dans chaque processus
+    parts = read_artifacts(version)
+    if parts is not None:
+        return Dataset.from_artifacts(version, parts)
+    return build_from_sources(version)
+
+
+# Index des filtres des lignes des classeurs, réutilisé par le processus tant que les classeurs ne changent pas
+_base_index = None
+
+
+def _filter_index(data, base, base_rows):
+    # Les lignes des lots mensuels, en fin de table, sont ajoutées aux bitmaps des classeurs
+    global _base_index
+    if _base_index is None or _base_index[0] != base:
+        _base_index = (base, FilterIndex(data.iloc[:base_rows]))
+    index = _base_index[1]
+    return index.append(data.iloc[base_rows:]) if len(data) > base_rows else index
+
+
+def build_from_sources(version):
+    """Construit le jeu de données depuis les classeurs et les lots mensuels.
+
+    La table des classeurs, les agrégats mensuels et l'index des classeurs sont repris des caches :
+    après un lot mensuel, le coût suit la taille des lots, pas celle de l'historique.
+    """
+    base = _base_version()
+    # Coordonnées réelles des villages (complétées depuis les limites régionales si besoin)
+    villages, regions = resolve_villages(load_typed_table(VILLAGES_PATH, read_villages))
+    data = _table_to_frame(shared_table(version, base))
+    cube, kpis = load_aggregates(data, base)
+    index = _filter_index(data, base, base_table(base).num_rows)
+    return Dataset(version, villages, data, cube, regions, filter_index=index, kpis=kpis)
+
+
+def serving_version():
+    # Avec des artefacts publiés, tous les processus servent la version publiée ;
+    # sinon la version des classeurs présents dans data/
+    return published_version() or data_version()
+
+
+_lock = threading.Lock()
+_refresher = None
+
+
+def get_refresher(interval=5.0):
+    """Surveille data/ (ou la version publiée) et recharge le jeu de données en arrière-plan, une instance par processus."""
+    # Instance unique par processus, partagée par toutes les sessions Streamlit ; ce module
+    # n'importe pas Streamlit pour rester utilisable par query.py et build.py
+    global _refresher
+    with _lock:
+        if _refresher is None:
+            _refresher = Refresher(build_dataset, serving_version, interval).start()
+        return _refresher
+
+
+def current_dataset():
+    # Aucune requête ne paie le rechargement : la version précédente est servie jusqu'à l'échange
+    return get_refresher().current()
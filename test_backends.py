@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+import backends
+from backends import BACKENDS, get_backend
+from utils import filter_data
+
+# Moteurs optionnels : le test correspondant est ignoré s'ils ne sont pas installés
+OPTIONAL = {'duckdb': 'duckdb', 'polars': 'polars'}
+GROUPS = ['ZONE', 'Activité', 'month_key']
+
+
+def _as_dict(keys, values):
+    # Clés en texte (catégories pandas, TEXT SQLite...) et sommes en flottants, pour comparer les moteurs
+    return {str(key): float(value) for key, value in zip(keys, values)}
+
+
+@pytest.mark.parametrize('name', list(BACKENDS))
+def test_backends_match_filter_data(data, random_filters, tmp_path, monkeypatch, name):
+    """Agrégats et totaux de chaque moteur identiques à ceux de filter_data sans index."""
+    if name in OPTIONAL:
+        pytest.importorskip(OPTIONAL[name])
+    monkeypatch.setattr(backends, 'CACHE_DIR', str(tmp_path))
+    backend = get_backend(lambda: data, 'test', name)
+    rng = np.random.default_rng(4)
+    for _ in range(100):
+        filters = random_filters(rng)
+        rows = filter_data(data, **filters)
+        for by in GROUPS:
+            expected = rows.groupby(by, observed=True)['Total Beneficiaire'].sum()
+            result = backend.aggregate(by, 'Total Beneficiaire', **filters)
+            assert _as_dict(result[by], result['Total Beneficiaire']) == _as_dict(expected.index, expected), (by, filters)
+        totals = backend.totals(['M', 'F'], **filters)
+        assert [float(totals['M']), float(totals['F'])] == [float(rows['M'].sum()), float(rows['F'].sum())], filters
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import DATES, ZONES
+from filter_index import AGE_GROUP_COLUMNS, SEX_COLUMNS, FilterIndex, SelectionCache
+from lru import BoundedLRU
+from utils import filter_data
+
+
+def test_bitmaps_match_chained_masks(data, random_filters):
+    """FilterIndex.select renvoie les mêmes lignes que les masques successifs de filter_data."""
+    index = FilterIndex(data)
+    rng = np.random.default_rng(0)
+    for _ in range(500):
+        filters = random_filters(rng)
+        expected = filter_data(data, **filters).index.to_numpy()
+        np.testing.assert_array_equal(index.select(**filters), expected, err_msg=str(filters))
+
+
+def test_bitmaps_from_parts_match(data, random_filters):
+    index = FilterIndex(data)
+    bitmaps = {group: getattr(index, group) for group in FilterIndex.BITMAP_GROUPS}
+    rebuilt = FilterIndex.from_bitmaps(index.size, index.row_months, bitmaps)
+    rng = np.random.default_rng(1)
+    for _ in range(100):
+        filters = random_filters(rng)
+        np.testing.assert_array_equal(rebuilt.select(**filters), index.select(**filters))
+
+
+def _drill_down(rng, data):
+    # Filtres resserrés pas à pas : zone, puis type d'activité, sexe, tranche d'âge et plage de dates
+    filters = {}
+    steps = [
+        ('zone', lambda: ZONES[rng.integers(len(ZONES))]),
+        ('activity_type', lambda: data['Activité'].cat.categories[rng.integers(len(data['Activité'].cat.categories))]),
+        ('sexe', lambda: list(SEX_COLUMNS)[rng.integers(len(SEX_COLUMNS))]),
+        ('age_group', lambda: list(AGE_GROUP_COLUMNS)[rng.integers(len(AGE_GROUP_COLUMNS))]),
+    ]
+    for i in rng.permutation(len(steps)):
+        name, value = steps[i]
+        filters[name] = value()
+        yield dict(filters)
+    start, end = sorted(rng.choice(DATES, 2, replace=False))
+    for _ in range(3):
+        filters['start_date'], filters['end_date'] = start, end
+        yield dict(filters)
+        start, end = start + pd.DateOffset(months=1), end - pd.DateOffset(months=1)
+
+
+@pytest.mark.parametrize('max_entries', [128, 4])
+def test_selection_cache_matches_index(data, max_entries):
+    """3000 requêtes de resserrement : le cache (avec raffinement et éviction) égale FilterIndex.select."""
+    index = FilterIndex(data)
+    cache = SelectionCache(index, max_entries=max_entries)
+    rng = np.random.default_rng(2)
+    queries = 0
+    while queries < 3000:
+        for filters in _drill_down(rng, data):
+            np.testing.assert_array_equal(cache.select(**filters), index.select(**filters), err_msg=str(filters))
+            queries += 1
+    assert cache.refinements > 0
+    assert len(cache) <= max_entries
+
+
+def test_bounded_lru_evicts_least_recently_used():
+    cache = BoundedLRU(max_entries=3, max_bytes=10, size=len)
+    cache.put('a', 'xxx')
+    cache.put('b', 'xxx')
+    cache.put('c', 'xxx')
+    assert cache.get('a') == 'xxx'
+    cache.put('d', 'x')
+    assert [key for key, _ in cache.items()] == ['c', 'a', 'd']
+    # Borne en octets : 3 + 1 + 7 > 10, les deux plus anciennes entrées sont évincées
+    cache.put('e', 'xxxxxxx')
+    assert [key for key, _ in cache.items()] == ['d', 'e']
+    assert cache.bytes == 8
+    assert cache.put('d', 'autre') == 'x'
+
+
+@pytest.mark.parametrize('split', [0, 8, 2_501])
+def test_append_matches_full_index(data, random_filters, split):
+    """Lignes ajoutées en fin de table : mêmes sélections qu'un index reconstruit sur toute la table."""
+    index = FilterIndex(data.iloc[:split]).append(data.iloc[split:])
+    full = FilterIndex(data)
+    rng = np.random.default_rng(3)
+    for _ in range(200):
+        filters = random_filters(rng)
+        np.testing.assert_array_equal(index.select(**filters), full.select(**filters), err_msg=str(filters))
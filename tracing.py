@@ -0,0 +1,144 @@
+import contextlib
+import functools
+import importlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+
+logger = logging.getLogger('dashboard.timing')
+
+# Fichier de journal JSON (une ligne par exécution du script), activé par variable d'environnement
+TIMING_LOG_PATH = os.environ.get('DASHBOARD_TIMING_LOG')
+if TIMING_LOG_PATH and not logger.handlers:
+    _handler = logging.FileHandler(TIMING_LOG_PATH, encoding='utf-8')
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+
+_local = threading.local()
+# Coût du premier import de chaque module chargé à la demande, pour tout le processus
+_import_costs = {}
+
+
+class Trace:
+    """Durées et nombres de lignes par étape pour une exécution (rerun) du tableau de bord."""
+
+    def __init__(self, name='rerun'):
+        self.name = name
+        self.run_id = uuid.uuid4().hex[:12]
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.stages = []
+        self.total_ms = None
+
+    def record(self, name, ms, rows=None):
+        self.stages.append({'stage': name, 'ms': round(ms, 3), 'rows': rows})
+
+    def to_dict(self):
+        return {
+            'trace': self.name,
+            'run_id': self.run_id,
+            'started_at': self.started_at,
+            'total_ms': self.total_ms,
+            'stages': self.stages,
+        }
+
+
+def start_trace(name='rerun'):
+    _local.trace = Trace(name)
+    return _local.trace
+
+
+def current_trace():
+    return getattr(_local, 'trace', None)
+
+
+def finish_trace():
+    """Clôt la trace courante et l'écrit dans le journal structuré."""
+    trace = current_trace()
+    if trace is None:
+        return None
+    trace.total_ms = round((time.perf_counter() - trace._start) * 1000, 3)
+    logger.info(json.dumps(trace.to_dict(), ensure_ascii=False, default=str))
+    _local.trace = None
+    return trace
+
+
+def _row_count(value):
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+
+@contextlib.contextmanager
+def stage(name, rows=None):
+    """Mesure un bloc ; sans trace active (scripts, banc d'essai) le coût est négligeable.
+
+    Le dictionnaire renvoyé permet de renseigner le nombre de lignes une fois connu :
+    `with stage('filter') as info: ...; info['rows'] = len(df)`.
+    """
+    info = {'rows': rows}
+    trace = current_trace()
+    if trace is None:
+        yield info
+        return
+    start = time.perf_counter()
+    try:
+        yield info
+    finally:
+        trace.record(name, (time.perf_counter() - start) * 1000, info['rows'])
+
+
+def traced(name):
+    """Décorateur : enregistre la durée d'une fonction et la taille de son résultat."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name) as info:
+                result = func(*args, **kwargs)
+                info['rows'] = _row_count(result)
+            return result
+        return wrapper
+    return decorator
+
+
+def lazy_import(name):
+    """Importe un module lourd au moment où la section qui l'utilise s'affiche.
+
+    Le premier import est mesuré (durée et nombre de modules chargés) et enregistré comme étape
+    `import:<module>` de la trace courante ; les appels suivants ne coûtent qu'une recherche.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    loaded = len(sys.modules)
+    start = time.perf_counter()
+    with stage(f'import:{name}'):
+        module = importlib.import_module(name)
+    _import_costs.setdefault(name, {
+        'module': name,
+        'ms': round((time.perf_counter() - start) * 1000, 3),
+        'modules_loaded': len(sys.modules) - loaded,
+    })
+    return module
+
+
+def import_report():
+    """Coûts des imports à la demande déjà effectués dans ce processus, du plus lent au plus rapide."""
+    return sorted(_import_costs.values(), key=lambda cost: cost['ms'], reverse=True)
+
+
+def render_debug_panel(container, trace):
+    """Affiche le détail des étapes d'une trace dans un conteneur Streamlit (ex. la barre latérale)."""
+    if trace is None:
+        return
+    container.markdown(f"**Exécution {trace.run_id}** : {trace.total_ms} ms")
+    container.dataframe(trace.stages, use_container_width=True)
+    if _import_costs:
+        container.markdown("**Imports à la demande (premier chargement)**")
+        container.dataframe(import_report(), use_container_width=True)
@@ -1,12 +1,22 @@
 import pandas as pd
 
+from tracing import traced
+
+def join_unique(values):
+    return ', '.join(pd.unique(values.dropna().astype(str)))
+
+@traced('merge_data')
 def merge_data(villages, activities):
     try:
         # Vérifier les colonnes nécessaires pour la fusion
         if 'ZONE' in villages.columns and 'ZONE' in activities.columns:
-            # Fusionner les DataFrames sur la colonne 'ZONE'
-            merged_data = pd.merge(activities, villages, on='ZONE')
-            return merged_data
+            # Les zones connues des villages, triées, sont les catégories de la ZONE : les activités
+            # ne portent que leur code, sans être dupliquées pour chaque village de la zone
+            zones = sorted(villages['ZONE'].dropna().astype(object).unique())
+            zone_codes = pd.Categorical(activities['ZONE'], categories=zones)
+            merged_data = activities[zone_codes.codes >= 0].copy()
+            merged_data['ZONE'] = zone_codes[zone_codes.codes >= 0]
+            return merged_data.reset_index(drop=True)
         else:
             raise KeyError("Colonnes pour la fusion non trouvées dans les DataFrames.")
     
@@ -15,7 +25,11 @@ def merge_data(villages, activities):
     except Exception as e:
         raise Exception(f"Erreur inattendue de fusion : {e}")
 
-def filter_data(df, zone=None, region=None, sexe=None, age_group=None, activity_type=None, start_date=None, end_date=None):
+@traced('filter_data')
+def filter_data(df, zone=None, region=None, sexe=None, age_group=None, activity_type=None, start_date=None, end_date=None, index=None):
+    if index is not None:
+        # Intersection des bitmaps précalculés, une seule sélection de lignes à la fin
+        return df.iloc[index.select(zone, sexe, age_group, activity_type, start_date, end_date)]
     if zone:
         df = df[df['ZONE'] == zone]
     if sexe: